@@ -0,0 +1,120 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from appwrite.client import Client
+from appwrite.services.account import Account
+from appwrite.services.databases import Databases
+from utils.logger import setup_colored_logging
+from utils.metrics import UpstreamTimer
+
+logger = setup_colored_logging()
+
+# Appwrite rejects Query.equal with more values than this
+APPWRITE_MAX_QUERY_VALUES = 100
+
+
+class AppwriteRepository:
+    """Async access to Appwrite for the FastAPI routes.
+
+    The Appwrite SDK is synchronous, so every call runs on a bounded thread pool
+    instead of the event loop. At most ``max_concurrency`` calls are in flight
+    and each one is given ``timeout`` seconds before the caller gets a
+    ``TimeoutError``.
+    """
+
+    def __init__(
+        self,
+        database: Databases,
+        endpoint: str,
+        project_id: str,
+        database_id: str,
+        max_workers: int = 16,
+        max_concurrency: int = 32,
+        timeout: float = 10.0,
+    ):
+        self.database = database
+        self.endpoint = endpoint
+        self.project_id = project_id
+        self.database_id = database_id
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="appwrite"
+            )
+        return self._executor
+
+    async def _call(self, operation: str, fn, *args):
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), partial(fn, *args))
+            try:
+                with UpstreamTimer("appwrite", operation):
+                    return await asyncio.wait_for(future, timeout=self.timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Appwrite {operation} timed out after {self.timeout}s")
+                raise
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # Documents
+
+    async def list_documents(self, collection_id: str, queries: list[str]) -> dict:
+        return await self._call(
+            "list_documents",
+            self.database.list_documents,
+            self.database_id,
+            collection_id,
+            queries,
+        )
+
+    async def create_document(self, collection_id: str, data: dict) -> dict:
+        return await self._call(
+            "create_document",
+            self.database.create_document,
+            self.database_id,
+            collection_id,
+            "unique()",
+            data,
+        )
+
+    async def update_document(
+        self, collection_id: str, document_id: str, data: dict
+    ) -> dict:
+        return await self._call(
+            "update_document",
+            self.database.update_document,
+            self.database_id,
+            collection_id,
+            document_id,
+            data,
+        )
+
+    async def delete_document(self, collection_id: str, document_id: str):
+        return await self._call(
+            "delete_document",
+            self.database.delete_document,
+            self.database_id,
+            collection_id,
+            document_id,
+        )
+
+    # Accounts
+
+    def _get_account(self, jwt: str) -> dict:
+        client = Client()
+        client.set_endpoint(self.endpoint)
+        client.set_project(self.project_id)
+        client.set_jwt(jwt)  # Set the JWT for this request
+        return Account(client).get()
+
+    async def get_account(self, jwt: str) -> dict:
+        """Fetch the account the JWT belongs to, this validates the JWT"""
+        return await self._call("account_get", self._get_account, jwt)
@@ -0,0 +1,187 @@
+"""Local stand-ins for TMDB and Appwrite with configurable latency.
+
+Only the endpoints the backend calls are implemented. Appwrite documents are
+kept in memory, JWTs are accepted as is and the JWT is the user id.
+
+    python -m benchmarks.fake_upstreams --tmdb-port 9101 --appwrite-port 9102
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+
+MOVIES_PER_PAGE = 20
+TOTAL_PAGES = 500
+
+
+def fake_movie(movie_id: int, query: str = "") -> dict:
+    title = f"{query.title()} Movie {movie_id}" if query else f"Movie {movie_id}"
+    return {
+        "adult": False,
+        "backdrop_path": f"/backdrop{movie_id}.jpg",
+        "genre_ids": [28, 12, 878],
+        "id": movie_id,
+        "original_language": "en",
+        "original_title": title,
+        "overview": f"Overview of {title}. " * 8,
+        "popularity": round(10000 / movie_id, 3),
+        "poster_path": f"/poster{movie_id}.jpg",
+        "release_date": "2024-01-15",
+        "title": title,
+        "video": False,
+        "vote_average": 7.5,
+        "vote_count": 1000,
+    }
+
+
+def create_tmdb_app(latency: float = 0.05) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+
+    def page_of_movies(page: int, query: str = "") -> dict:
+        first = (page - 1) * MOVIES_PER_PAGE + 1
+        return {
+            "page": page,
+            "results": [
+                fake_movie(movie_id, query)
+                for movie_id in range(first, first + MOVIES_PER_PAGE)
+            ],
+            "total_pages": TOTAL_PAGES,
+            "total_results": TOTAL_PAGES * MOVIES_PER_PAGE,
+        }
+
+    @app.get("/3/discover/movie")
+    async def discover(page: int = 1):
+        app.state.requests += 1
+        await asyncio.sleep(latency)
+        return page_of_movies(page)
+
+    @app.get("/3/search/movie")
+    async def search(query: str, page: int = 1):
+        app.state.requests += 1
+        await asyncio.sleep(latency)
+        return page_of_movies(page, query)
+
+    return app
+
+
+def matches(doc: dict, queries: list[dict]) -> bool:
+    for query in queries:
+        if (
+            query["method"] == "equal"
+            and doc.get(query["attribute"]) not in query["values"]
+        ):
+            return False
+    return True
+
+
+def apply_queries(docs: list[dict], queries: list[dict]) -> list[dict]:
+    docs = [doc for doc in docs if matches(doc, queries)]
+    limit = 25
+    for query in queries:
+        method = query["method"]
+        if method in ("orderAsc", "orderDesc"):
+            docs.sort(
+                key=lambda doc: doc.get(query["attribute"]),
+                reverse=method == "orderDesc",
+            )
+        elif method == "cursorAfter":
+            ids = [doc["$id"] for doc in docs]
+            cursor = query["values"][0]
+            docs = docs[ids.index(cursor) + 1 :] if cursor in ids else []
+        elif method == "limit":
+            limit = query["values"][0]
+    return docs[:limit]
+
+
+def create_appwrite_app(latency: float = 0.02) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+    # collection id -> document id -> document, in creation order
+    collections: dict[str, dict[str, dict]] = {}
+    ids = itertools.count(1)
+    prefix = "/v1/databases/{database_id}/collections/{collection_id}/documents"
+
+    async def delay():
+        app.state.requests += 1
+        await asyncio.sleep(latency)
+
+    @app.get("/v1/account")
+    async def account(request: Request):
+        await delay()
+        jwt = request.headers.get("x-appwrite-jwt")
+        if not jwt:
+            raise HTTPException(status_code=401, detail="Missing JWT")
+        return {"$id": jwt, "name": jwt}
+
+    @app.get(prefix)
+    async def list_documents(collection_id: str, request: Request):
+        await delay()
+        queries = [
+            json.loads(value)
+            for key, value in request.query_params.multi_items()
+            if key.startswith("queries[")
+        ]
+        docs = apply_queries(list(collections.get(collection_id, {}).values()), queries)
+        return {"total": len(docs), "documents": docs}
+
+    @app.post(prefix)
+    async def create_document(collection_id: str, request: Request):
+        await delay()
+        body = await request.json()
+        doc_id = body.get("documentId", "unique()")
+        if doc_id == "unique()":
+            doc_id = f"doc{next(ids):08d}"
+        doc = {"$id": doc_id, **body["data"]}
+        collections.setdefault(collection_id, {})[doc_id] = doc
+        return doc
+
+    @app.patch(prefix + "/{document_id}")
+    async def update_document(collection_id: str, document_id: str, request: Request):
+        await delay()
+        doc = collections.get(collection_id, {}).get(document_id)
+        if doc is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        doc.update((await request.json()).get("data", {}))
+        return doc
+
+    @app.delete(prefix + "/{document_id}")
+    async def delete_document(collection_id: str, document_id: str):
+        await delay()
+        if collections.get(collection_id, {}).pop(document_id, None) is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        return {}
+
+    return app
+
+
+async def serve(
+    tmdb_port: int, appwrite_port: int, tmdb_latency: float, appwrite_latency: float
+):
+    servers = [
+        uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        for app, port in [
+            (create_tmdb_app(tmdb_latency), tmdb_port),
+            (create_appwrite_app(appwrite_latency), appwrite_port),
+        ]
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tmdb-port", type=int, default=9101)
+    parser.add_argument("--appwrite-port", type=int, default=9102)
+    parser.add_argument("--tmdb-latency", type=float, default=0.05)
+    parser.add_argument("--appwrite-latency", type=float, default=0.02)
+    args = parser.parse_args()
+    asyncio.run(
+        serve(
+            args.tmdb_port, args.appwrite_port, args.tmdb_latency, args.appwrite_latency
+        )
+    )
@@ -0,0 +1,365 @@
+"""Benchmark the backend against local TMDB and Appwrite stand-ins.
+
+Starts the fake upstreams and the app as subprocesses, drives the HTTP routes
+and a crowd of WebSocket clients, prints a summary and saves it as JSON so
+runs can be compared.
+
+    python -m benchmarks.run --requests 1000 --concurrency 50 --ws-clients 200
+    python -m benchmarks.run --compare latest --app-env MOVIES_CACHE_TTL=0
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+import httpx
+import websockets
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+SEARCH_TERMS = [f"term{i}" for i in range(50)]
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    """Requests per second and latency percentiles in milliseconds"""
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)
+        return round(ordered[index] * 1000, 2)
+
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": percentile(50),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient, make_request, total: int, concurrency: int
+) -> dict:
+    """Run ``total`` requests built by ``make_request(i)`` with bounded concurrency"""
+    latencies: list[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < total:
+            start = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def auth(user: int) -> dict:
+    # The fake Appwrite accepts any JWT and uses it as the user id
+    return {"Authorization": f"Bearer bench-user-{user}"}
+
+
+async def movies_request(client: httpx.AsyncClient, i: int):
+    if i % 5 == 0:
+        return await client.get("/api/movies")
+    return await client.get(
+        "/api/movies", params={"search_term": random.choice(SEARCH_TERMS)}
+    )
+
+
+async def trending_request(client: httpx.AsyncClient, i: int):
+    return await client.get("/api/movies/trending")
+
+
+def favorites_request(users: int):
+    async def request(client: httpx.AsyncClient, i: int):
+        user, step = (i // 3) % users, i % 3
+        movie = {"id": 1000 + i // 3, "title": f"Benchmark {i // 3}"}
+        if step == 0:
+            return await client.post(
+                "/api/favorites", json={"movie": movie}, headers=auth(user)
+            )
+        if step == 1:
+            return await client.get("/api/favorites", headers=auth(user))
+        return await client.request(
+            "DELETE",
+            "/api/favorites",
+            json={"movie": {"id": movie["id"]}},
+            headers=auth(user),
+        )
+
+    return request
+
+
+async def websocket_fanout(base_url: str, clients: int, broadcasts: int) -> dict:
+    """Connect ``clients`` sockets and time how long each favorite takes to
+    reach every other client"""
+    ws_url = base_url.replace("http://", "ws://")
+    sockets = []
+    connect_start = time.perf_counter()
+    for i in range(clients):
+        websocket = await websockets.connect(
+            f"{ws_url}/ws/bench-user-{i}?jwt=bench-user-{i}", max_queue=None
+        )
+        await websocket.recv()  # connection_established
+        sockets.append(websocket)
+    connect_seconds = time.perf_counter() - connect_start
+
+    async def wait_for_favorite(websocket, title: str):
+        while True:
+            message = json.loads(await websocket.recv())
+            if title in message.get("message", ""):
+                return time.perf_counter()
+
+    fanout_times = []
+    timeouts = 0
+    try:
+        for round_number in range(broadcasts):
+            title = f"Fanout {round_number}"
+            waiters = [
+                asyncio.create_task(wait_for_favorite(websocket, title))
+                for websocket in sockets[1:]
+            ]
+            start = time.perf_counter()
+            await sockets[0].send(
+                json.dumps(
+                    {
+                        "type": "favorite_movie",
+                        "movie": {"id": round_number, "title": title},
+                        "user_name": "bench",
+                    }
+                )
+            )
+            try:
+                received = await asyncio.wait_for(asyncio.gather(*waiters), 30)
+                fanout_times.append(max(received, default=start) - start)
+            except asyncio.TimeoutError:
+                timeouts += 1
+                for waiter in waiters:
+                    waiter.cancel()
+    finally:
+        await asyncio.gather(
+            *(websocket.close() for websocket in sockets), return_exceptions=True
+        )
+
+    fanout = summarize(fanout_times, sum(fanout_times) or 1, timeouts)
+    return {
+        "clients": clients,
+        "connect_seconds": round(connect_seconds, 3),
+        "broadcasts": fanout["requests"],
+        "timeouts": timeouts,
+        "fanout_p50_ms": fanout["p50_ms"],
+        "fanout_p99_ms": fanout["p99_ms"],
+        "fanout_max_ms": fanout["max_ms"],
+    }
+
+
+def start_process(args: list[str], env: dict | None = None) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args], cwd=BACKEND_DIR, env={**os.environ, **(env or {})}
+    )
+
+
+async def wait_until_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} did not come up in {timeout}s")
+
+
+def app_env(args) -> dict:
+    env = {
+        "TMDB_BASE_URL": f"http://127.0.0.1:{args.tmdb_port}/3",
+        "TMDB_API_KEY": "benchmark",
+        "APPWRITE_ENDPOINT": f"http://127.0.0.1:{args.appwrite_port}/v1",
+        "APPWRITE_PROJECT_ID": "benchmark",
+        "APPWRITE_DATABASE_ID": "benchmark",
+        "APPWRITE_COLLECTION_ID": "search_counts",
+        "APPWRITE_FAVORITES_COLLECTION_ID": "favorites",
+        "APPWRITE_API_KEY": "benchmark",
+        "LOG_LEVEL": "WARNING",
+    }
+    for setting in args.app_env:
+        key, _, value = setting.partition("=")
+        env[key] = value
+    return env
+
+
+async def run_scenarios(args) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=30
+    ) as client:
+        scenarios = {
+            "movies": movies_request,
+            "trending": trending_request,
+            "favorites": favorites_request(args.users),
+        }
+        for name, make_request in scenarios.items():
+            if name in args.scenarios:
+                results[name] = await drive(
+                    client, make_request, args.requests, args.concurrency
+                )
+                print(f"{name:>10}: {results[name]}")
+    if "websocket" in args.scenarios:
+        results["websocket"] = await websocket_fanout(
+            base_url, args.ws_clients, args.ws_broadcasts
+        )
+        print(f"{'websocket':>10}: {results['websocket']}")
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(run: dict, directory: Path) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    path.write_text(json.dumps(run, indent=2))
+    return path
+
+
+def compare(current: dict, previous: dict):
+    """Print the change of every numeric result against an earlier run"""
+    print(f"\nCompared with {previous.get('timestamp')} ({previous.get('commit')})")
+    for scenario, metrics in current["results"].items():
+        before = previous.get("results", {}).get(scenario, {})
+        for metric, value in metrics.items():
+            old = before.get(metric)
+            if not isinstance(value, (int, float)) or not old:
+                continue
+            change = (value - old) / old * 100
+            print(f"  {scenario}.{metric}: {old} -> {value} ({change:+.1f}%)")
+
+
+def load_previous(reference: str, directory: Path, exclude: Path) -> dict | None:
+    if reference == "latest":
+        runs = sorted(p for p in directory.glob("*.json") if p != exclude)
+        if not runs:
+            return None
+        return json.loads(runs[-1].read_text())
+    return json.loads(Path(reference).read_text())
+
+
+def parse_args(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--ws-clients", type=int, default=100)
+    parser.add_argument("--ws-broadcasts", type=int, default=20)
+    parser.add_argument("--tmdb-latency", type=float, default=0.05)
+    parser.add_argument("--appwrite-latency", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--tmdb-port", type=int, default=9101)
+    parser.add_argument("--appwrite-port", type=int, default=9102)
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=["movies", "trending", "favorites", "websocket"],
+        choices=["movies", "trending", "favorites", "websocket"],
+    )
+    parser.add_argument(
+        "--app-env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Extra environment for the app, e.g. WS_DIGEST_WINDOW=0.5",
+    )
+    parser.add_argument("--results-dir", type=Path, default=RESULTS_DIR)
+    parser.add_argument(
+        "--compare", metavar="FILE", help="Earlier result file, or 'latest'"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    upstreams = start_process(
+        [
+            "-m",
+            "benchmarks.fake_upstreams",
+            f"--tmdb-port={args.tmdb_port}",
+            f"--appwrite-port={args.appwrite_port}",
+            f"--tmdb-latency={args.tmdb_latency}",
+            f"--appwrite-latency={args.appwrite_latency}",
+        ]
+    )
+    app = start_process(
+        [
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--host=127.0.0.1",
+            f"--port={args.port}",
+            "--log-level=warning",
+        ],
+        env=app_env(args),
+    )
+    try:
+        asyncio.run(wait_until_ready(f"http://127.0.0.1:{args.tmdb_port}/docs"))
+        asyncio.run(wait_until_ready(f"http://127.0.0.1:{args.port}/"))
+        results = asyncio.run(run_scenarios(args))
+    finally:
+        for process in (app, upstreams):
+            process.terminate()
+            process.wait(timeout=10)
+
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": {
+            key: value if not isinstance(value, Path) else str(value)
+            for key, value in vars(args).items()
+        },
+        "results": results,
+    }
+    path = save_results(run, args.results_dir)
+    print(f"\nSaved results to {path}")
+    if args.compare:
+        previous = load_previous(args.compare, args.results_dir, path)
+        if previous is None:
+            print("No earlier run to compare with")
+        else:
+            compare(run, previous)
+
+
+if __name__ == "__main__":
+    main()
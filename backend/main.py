@@ -1,7 +1,10 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import FastAPI, HTTPException, Request, Response, Depends
+from fastapi import Query as QueryParam
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError
+from typing import Literal
 import os
 import httpx
 from dotenv import load_dotenv
@@ -10,13 +13,42 @@ import urllib.parse as urlparse
 from appwrite.client import Client
 from appwrite.services.databases import Databases
 from appwrite.query import Query
-from appwrite.services.account import Account
 from appwrite.exception import AppwriteException
 import json
-import threading
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
 from fastapi import WebSocket, WebSocketDisconnect
 from websocket_manager import manager
-from utils.logger import setup_colored_logging
+from utils.logger import configure_logging, setup_colored_logging
+from utils.http_client import create_tmdb_client
+from utils.cache import TTLCache, STALE
+from utils.single_flight import SingleFlight
+from utils.search_counts import (
+    PartialFlushError,
+    SearchCountAggregator,
+    SearchCountBatch,
+)
+from utils.leaderboard import TrendingLeaderboard
+from utils.jwt_cache import JWTCache, INVALID
+from appwrite_repository import APPWRITE_MAX_QUERY_VALUES, AppwriteRepository
+from utils.favorites_cache import FavoritesCache
+from utils.pubsub import create_broker
+from utils.ws_codec import available_encodings, negotiate
+from utils.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    LoopLagMonitor,
+    MetricsMiddleware,
+    UpstreamTimer,
+    registry as metrics,
+)
+from utils.profiling import ProfilingMiddleware
+from utils import fast_json
+from utils.fast_json import SerializedJSON
+from utils.compression import choose_encoding, compress
+from utils.prefetch import Prefetcher
+from utils.suggest_index import SuggestIndex
+from utils.disk_cache import DiskCache
 
 
 logger = setup_colored_logging()
@@ -40,10 +72,54 @@ class Movie(BaseModel):
 
 
 class Movies(BaseModel):
+    page: int | None = None
+    total_pages: int | None = None
+    total_results: int | None = None
     results: list[Movie]
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for the whole app so TMDB connections are kept alive
+    app.state.tmdb_client = create_tmdb_client(
+        headers,
+        max_connections=TMDB_MAX_CONNECTIONS,
+        max_keepalive_connections=TMDB_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=TMDB_KEEPALIVE_EXPIRY,
+        timeout=TMDB_TIMEOUT,
+        connect_timeout=TMDB_CONNECT_TIMEOUT,
+        http2=TMDB_HTTP2,
+    )
+    search_counts.start()
+    broker = create_broker(WS_BROKER, WS_BROKER_URL)
+    if broker is not None:
+        await manager.start_broker(broker, WS_BROKER_CHANNEL)
+    manager.start_heartbeat()
+    loop_lag.start()
+    load_suggest_snapshot()
+    if movies_disk_cache is not None:
+        await movies_disk_cache.compact()
+    trending_reconciler = asyncio.create_task(reconcile_trending_periodically())
+    try:
+        yield
+    finally:
+        trending_reconciler.cancel()
+        await movies_prefetcher.stop()
+        save_suggest_snapshot()
+        if movies_disk_cache is not None:
+            movies_disk_cache.close()
+        await loop_lag.stop()
+        await manager.stop_heartbeat()
+        await manager.flush_digest()
+        await manager.stop_broker()
+        await search_counts.stop()
+        await app.state.tmdb_client.aclose()
+        logger.info("TMDB client closed")
+        appwrite.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 # Combine multiple regex patterns into a single pattern using alternation (|)
 origins_regex = r"^(http://localhost.*|http://frontend:.*|https://.*\.run\.app|https://.*\.cloudfunctions\.net)$"
@@ -59,7 +135,7 @@ app.add_middleware(
 
 
 BASE_DIR = Path(__file__).resolve().parent
-print(f"Base directory: {BASE_DIR}")
+logger.info(f"Base directory: {BASE_DIR}")
 
 # Explicitly point to .env file
 env_path = BASE_DIR / ".env"
@@ -67,10 +143,17 @@ env_path = BASE_DIR / ".env"
 # Load environment variables from .env file (if it exists)
 # In Docker, environment variables will be passed at runtime instead
 if env_path.exists():
-    print(f"Loading environment variables from {env_path}")
+    logger.info(f"Loading environment variables from {env_path}")
     load_dotenv(env_path)
 else:
-    print("No .env file found, using environment variables from system/Docker")
+    logger.info("No .env file found, using environment variables from system/Docker")
+
+# "json" for structured production logs, colored output otherwise
+LOG_FORMAT = os.getenv("LOG_FORMAT", "color")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Only 1 in LOG_SAMPLE_RATE per-message WebSocket logs is written
+LOG_SAMPLE_RATE = int(os.getenv("LOG_SAMPLE_RATE", "100"))
+configure_logging(LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATE)
 
 TMDB_BASE_URL = os.getenv("TMDB_BASE_URL")
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
@@ -78,15 +161,127 @@ TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 if not TMDB_API_KEY:
     raise ValueError("TMDB_API_KEY environment variable is required")
 
+# TMDB connection pool configuration
+TMDB_MAX_CONNECTIONS = int(os.getenv("TMDB_MAX_CONNECTIONS", "100"))
+TMDB_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("TMDB_MAX_KEEPALIVE_CONNECTIONS", "20"))
+TMDB_KEEPALIVE_EXPIRY = float(os.getenv("TMDB_KEEPALIVE_EXPIRY", "30"))
+TMDB_TIMEOUT = float(os.getenv("TMDB_TIMEOUT", "10"))
+TMDB_CONNECT_TIMEOUT = float(os.getenv("TMDB_CONNECT_TIMEOUT", "5"))
+TMDB_HTTP2 = os.getenv("TMDB_HTTP2", "false").lower() == "true"
+
+# TMDB response cache configuration
+MOVIES_CACHE_MAXSIZE = int(os.getenv("MOVIES_CACHE_MAXSIZE", "1024"))
+MOVIES_CACHE_TTL = float(os.getenv("MOVIES_CACHE_TTL", "300"))
+MOVIES_CACHE_STALE_TTL = float(os.getenv("MOVIES_CACHE_STALE_TTL", "600"))
+
+# Optional SQLite tier under the memory cache, shared by the workers on a host
+# and kept across restarts, so a cold worker can skip TMDB for popular queries
+MOVIES_DISK_CACHE_PATH = os.getenv("MOVIES_DISK_CACHE_PATH")
+MOVIES_DISK_CACHE_TTL = float(os.getenv("MOVIES_DISK_CACHE_TTL", "3600"))
+MOVIES_DISK_CACHE_MAX_BYTES = int(
+    os.getenv("MOVIES_DISK_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+
+# Background prefetch of the next results page, skipped when over budget
+MOVIES_PREFETCH_ENABLED = os.getenv("MOVIES_PREFETCH_ENABLED", "true").lower() == "true"
+MOVIES_PREFETCH_MAX_INFLIGHT = int(os.getenv("MOVIES_PREFETCH_MAX_INFLIGHT", "4"))
+MOVIES_PREFETCH_RATE = float(os.getenv("MOVIES_PREFETCH_RATE", "5"))
+MOVIES_PREFETCH_BURST = int(os.getenv("MOVIES_PREFETCH_BURST", "10"))
+
+# Title typeahead index, kept across restarts when a snapshot path is set
+SUGGEST_INDEX_MAXSIZE = int(os.getenv("SUGGEST_INDEX_MAXSIZE", "50000"))
+SUGGEST_SNAPSHOT_PATH = os.getenv("SUGGEST_SNAPSHOT_PATH")
+
+# Responses at least this many bytes are gzip/brotli compressed if accepted
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Search count write-behind configuration
+SEARCH_COUNT_FLUSH_INTERVAL = float(os.getenv("SEARCH_COUNT_FLUSH_INTERVAL", "5"))
+SEARCH_COUNT_BATCH_SIZE = int(os.getenv("SEARCH_COUNT_BATCH_SIZE", "100"))
+SEARCH_COUNT_MAX_PENDING = int(os.getenv("SEARCH_COUNT_MAX_PENDING", "10000"))
+
+# Trending leaderboard configuration
+TRENDING_LIMIT = int(os.getenv("TRENDING_LIMIT", "5"))
+TRENDING_CAPACITY = int(os.getenv("TRENDING_CAPACITY", "50"))
+TRENDING_RECONCILE_INTERVAL = float(os.getenv("TRENDING_RECONCILE_INTERVAL", "60"))
+
+# JWT validation cache configuration
+JWT_CACHE_MAXSIZE = int(os.getenv("JWT_CACHE_MAXSIZE", "10000"))
+JWT_CACHE_MAX_TTL = float(os.getenv("JWT_CACHE_MAX_TTL", "300"))
+JWT_CACHE_NEGATIVE_TTL = float(os.getenv("JWT_CACHE_NEGATIVE_TTL", "30"))
+
 # Appwrite configuration
 APPWRITE_ENDPOINT = os.getenv("APPWRITE_ENDPOINT")
 APPWRITE_PROJECT_ID = os.getenv("APPWRITE_PROJECT_ID")
 APPWRITE_DATABASE_ID = os.getenv("APPWRITE_DATABASE_ID")
 APPWRITE_COLLECTION_ID = os.getenv("APPWRITE_COLLECTION_ID")
 APPWRITE_API_KEY = os.getenv("APPWRITE_API_KEY")
+APPWRITE_FAVORITES_COLLECTION_ID = os.getenv(
+    "APPWRITE_FAVORITES_COLLECTION_ID", "685996b7001270f656eb"
+)
 
-print("Environment variables loaded successfully")
-print(f"TMDB_BASE_URL: {TMDB_BASE_URL}")
+# Appwrite call limits, the SDK is synchronous and runs on a thread pool
+APPWRITE_MAX_WORKERS = int(os.getenv("APPWRITE_MAX_WORKERS", "16"))
+APPWRITE_MAX_CONCURRENCY = int(os.getenv("APPWRITE_MAX_CONCURRENCY", "32"))
+APPWRITE_TIMEOUT = float(os.getenv("APPWRITE_TIMEOUT", "10"))
+
+# Per-user favorites cache configuration
+FAVORITES_CACHE_MAXSIZE = int(os.getenv("FAVORITES_CACHE_MAXSIZE", "10000"))
+FAVORITES_CACHE_TTL = float(os.getenv("FAVORITES_CACHE_TTL", "60"))
+FAVORITES_PAGE_SIZE = int(os.getenv("FAVORITES_PAGE_SIZE", "100"))
+FAVORITES_BULK_MAX_OPERATIONS = int(os.getenv("FAVORITES_BULK_MAX_OPERATIONS", "500"))
+FAVORITES_BULK_CONCURRENCY = int(os.getenv("FAVORITES_BULK_CONCURRENCY", "8"))
+
+# WebSocket outbound queue configuration
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+# drop_oldest, drop_newest or disconnect
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+WS_REGISTRY_SHARDS = int(os.getenv("WS_REGISTRY_SHARDS", "16"))
+
+# Cross-worker WebSocket fan-out, "memory" for a single worker or "redis"
+WS_BROKER = os.getenv("WS_BROKER", "memory")
+WS_BROKER_URL = os.getenv("WS_BROKER_URL", "redis://localhost:6379/0")
+WS_BROKER_CHANNEL = os.getenv("WS_BROKER_CHANNEL", "movies:ws")
+
+# Batch new_favorite notifications into one digest per window, 0 sends each at once
+WS_DIGEST_WINDOW = float(os.getenv("WS_DIGEST_WINDOW", "0"))
+WS_DIGEST_MAX_EVENTS = int(os.getenv("WS_DIGEST_MAX_EVENTS", "100"))
+
+# Server heartbeat, connections quiet for WS_IDLE_TIMEOUT seconds are reaped
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "90"))
+WS_REAP_BATCH_SIZE = int(os.getenv("WS_REAP_BATCH_SIZE", "100"))
+# Protocol level ping frames, sent and checked by uvicorn
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+WS_PING_TIMEOUT = float(os.getenv("WS_PING_TIMEOUT", "20"))
+# Negotiated by uvicorn with clients that offer it
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
+
+manager.configure(
+    WS_SEND_QUEUE_SIZE,
+    WS_SLOW_CONSUMER_POLICY,
+    WS_REGISTRY_SHARDS,
+    digest_window=WS_DIGEST_WINDOW,
+    digest_max_events=WS_DIGEST_MAX_EVENTS,
+    heartbeat_interval=WS_HEARTBEAT_INTERVAL,
+    idle_timeout=WS_IDLE_TIMEOUT,
+    reap_batch_size=WS_REAP_BATCH_SIZE,
+)
+
+# How often the event loop lag gauge is sampled
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "1"))
+
+# Opt-in profiling of single requests sent with an X-Profile header
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_DIR = os.getenv(
+    "PROFILING_DIR", os.path.join(tempfile.gettempdir(), "movies-profiles")
+)
+PROFILING_MAX_PER_MINUTE = int(os.getenv("PROFILING_MAX_PER_MINUTE", "6"))
+PROFILING_KEEP = int(os.getenv("PROFILING_KEEP", "50"))
+
+logger.info("Environment variables loaded successfully")
+logger.info(f"TMDB_BASE_URL: {TMDB_BASE_URL}")
 
 
 headers = {
@@ -100,28 +295,236 @@ async def root():
     return {"message": "Welcome to the Movie App API!"}
 
 
-@app.get("/api/movies", response_model=Movies)
-async def get_movies(search_term: str = None):
+movies_cache = TTLCache(
+    maxsize=MOVIES_CACHE_MAXSIZE,
+    ttl=MOVIES_CACHE_TTL,
+    stale_ttl=MOVIES_CACHE_STALE_TTL,
+)
+
+# Concurrent requests for the same TMDB URL share one upstream call
+tmdb_requests = SingleFlight()
+suggest_index = SuggestIndex(maxsize=SUGGEST_INDEX_MAXSIZE)
+movies_disk_cache = (
+    DiskCache(
+        MOVIES_DISK_CACHE_PATH,
+        ttl=MOVIES_DISK_CACHE_TTL,
+        max_bytes=MOVIES_DISK_CACHE_MAX_BYTES,
+    )
+    if MOVIES_DISK_CACHE_PATH
+    else None
+)
+
+
+def load_suggest_snapshot():
+    if not SUGGEST_SNAPSHOT_PATH or not os.path.exists(SUGGEST_SNAPSHOT_PATH):
+        return
     try:
-        URL = None
-        if search_term:
-            URL = f"{TMDB_BASE_URL}/search/movie?query={urlparse.quote(search_term)}"
-        else:
-            URL = f"{TMDB_BASE_URL}/discover/movie?sort_by=popularity.desc"
-        movies = None
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                URL,
-                headers=headers,
-            )
+        count = suggest_index.load(SUGGEST_SNAPSHOT_PATH)
+        logger.info(f"Loaded {count} titles from {SUGGEST_SNAPSHOT_PATH}")
+    except Exception as e:
+        logger.warning(f"Could not load suggest snapshot: {e}")
+
+
+def save_suggest_snapshot():
+    if not SUGGEST_SNAPSHOT_PATH:
+        return
+    try:
+        suggest_index.save(SUGGEST_SNAPSHOT_PATH)
+        logger.info(f"Saved {len(suggest_index)} titles to {SUGGEST_SNAPSHOT_PATH}")
+    except Exception as e:
+        logger.warning(f"Could not save suggest snapshot: {e}")
+
+
+# Keep references to fire-and-forget tasks so they are not garbage collected
+background_tasks: set[asyncio.Task] = set()
+
+
+def get_tmdb_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.tmdb_client
+
+
+def movies_cache_key(search_term: str | None, page: int = 1) -> tuple[str, str, int]:
+    if not search_term:
+        return ("discover", "", page)
+    # Case and whitespace differences should share one cache entry
+    return ("search", " ".join(search_term.split()).lower(), page)
+
+
+def movies_payload(data: dict) -> SerializedJSON:
+    """Validate a TMDB page once, when it enters the cache, and encode it"""
+    try:
+        movies = Movies.model_validate(data).model_dump()
+    except ValidationError as e:
+        raise HTTPException(status_code=500, detail=f"Invalid TMDB response: {e}")
+    suggest_index.add_movies(movies["results"])
+    return SerializedJSON(movies)
+
+
+async def fetch_tmdb(
+    tmdb_client: httpx.AsyncClient, url: str, from_disk: bool = True
+) -> SerializedJSON:
+    """A TMDB page from the disk cache if enabled and fresh there, else from TMDB.
+    ``from_disk=False`` always goes upstream, e.g. to refresh a stale entry."""
+
+    async def fetch():
+        if movies_disk_cache is not None and from_disk:
+            body = await movies_disk_cache.get(url)
+            if body is not None:
+                # Validated before it was written
+                movies = SerializedJSON(fast_json.loads(body), body)
+                suggest_index.add_movies(movies.data["results"])
+                return movies
+        with UpstreamTimer("tmdb", urlparse.urlparse(url).path):
+            response = await tmdb_client.get(url)
             response.raise_for_status()
-            movies = response.json()
-        if len(movies["results"]) > 0 and search_term is not None:
-            print(f"Updating search count for: {search_term}")
-            threading.Thread(
-                target=update_search_count, args=(search_term, movies["results"][0])
-            ).start()
+        movies = movies_payload(fast_json.loads(response.content))
+        if movies_disk_cache is not None:
+            # Written in the background, the response doesn't wait for the disk
+            task = asyncio.create_task(movies_disk_cache.set(url, movies.body))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
         return movies
+
+    return await tmdb_requests.do(url, fetch)
+
+
+def movies_url(search_term: str | None, page: int = 1) -> str:
+    if search_term:
+        return f"{TMDB_BASE_URL}/search/movie?query={urlparse.quote(search_term)}&page={page}"
+    return f"{TMDB_BASE_URL}/discover/movie?sort_by=popularity.desc&page={page}"
+
+
+async def prefetch_movies(
+    tmdb_client: httpx.AsyncClient, search_term: str | None, page: int
+):
+    cache_key = movies_cache_key(search_term, page)
+    if cache_key not in movies_cache:
+        movies_cache.set(
+            cache_key, await fetch_tmdb(tmdb_client, movies_url(search_term, page))
+        )
+
+
+async def refresh_movies_cache(tmdb_client: httpx.AsyncClient, url: str, cache_key):
+    try:
+        movies_cache.set(cache_key, await fetch_tmdb(tmdb_client, url, from_disk=False))
+    except Exception as e:
+        logger.warning(f"Background refresh failed for {cache_key}: {e}")
+    finally:
+        movies_cache.end_refresh(cache_key)
+
+
+MOVIE_FIELDS = tuple(Movie.model_fields)
+# What the movie list cards use, sent unless the client asks for other fields
+COMPACT_MOVIE_FIELDS = (
+    "id",
+    "title",
+    "vote_average",
+    "poster_path",
+    "release_date",
+    "original_language",
+)
+
+
+def parse_fields(
+    fields: str | None, allowed: tuple[str, ...], default: tuple[str, ...] | None
+) -> tuple[str, ...] | None:
+    """Comma separated field names, "all" or None for every field"""
+    if fields is None:
+        return default
+    if fields == "all":
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    if not requested:
+        raise HTTPException(status_code=400, detail="No fields requested")
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    # Keep the model's order so equal projections share a cached variant
+    return tuple(name for name in allowed if name in requested)
+
+
+def project(items: list[dict], fields: tuple[str, ...] | None) -> list[dict]:
+    if fields is None:
+        return items
+    return [{name: item.get(name) for name in fields} for item in items]
+
+
+def json_response(
+    body: bytes, request: Request, payload: SerializedJSON | None = None, key=None
+) -> Response:
+    """Send JSON, compressed when the client accepts it and the body is large
+    enough. Compressed bytes are kept on ``payload`` for later hits."""
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return Response(body, media_type="application/json")
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        if payload is not None:
+            body = payload.variant((key, encoding), lambda: compress(body, encoding))
+        else:
+            body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+movies_prefetcher = Prefetcher(
+    max_inflight=MOVIES_PREFETCH_MAX_INFLIGHT,
+    rate=MOVIES_PREFETCH_RATE,
+    burst=MOVIES_PREFETCH_BURST,
+)
+
+# TMDB serves at most this many pages
+TMDB_MAX_PAGE = 500
+
+
+@app.get("/api/movies", response_model=Movies)
+async def get_movies(
+    request: Request,
+    search_term: str = None,
+    page: int = QueryParam(1, ge=1, le=TMDB_MAX_PAGE),
+    fields: str | None = None,
+    tmdb_client: httpx.AsyncClient = Depends(get_tmdb_client),
+):
+    projection = parse_fields(fields, MOVIE_FIELDS, COMPACT_MOVIE_FIELDS)
+    try:
+        URL = movies_url(search_term, page)
+        cache_key = movies_cache_key(search_term, page)
+        movies, state = movies_cache.get(cache_key)
+        if movies is None:
+            movies = await fetch_tmdb(tmdb_client, URL)
+            movies_cache.set(cache_key, movies)
+        elif state == STALE and movies_cache.begin_refresh(cache_key):
+            task = asyncio.create_task(
+                refresh_movies_cache(tmdb_client, URL, cache_key)
+            )
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+        results = movies.data["results"]
+        # Only the first page is a new search, later ones are scrolling
+        if len(results) > 0 and search_term is not None and page == 1:
+            search_counts.record(search_term, results[0])
+        next_page = page + 1
+        if (
+            MOVIES_PREFETCH_ENABLED
+            and next_page <= min(movies.data["total_pages"] or 0, TMDB_MAX_PAGE)
+            and movies_cache_key(search_term, next_page) not in movies_cache
+        ):
+            movies_prefetcher.schedule(
+                movies_cache_key(search_term, next_page),
+                lambda: prefetch_movies(tmdb_client, search_term, next_page),
+            )
+        # Already validated and encoded, skip the response_model round trip
+        body = movies.body
+        if projection is not None:
+            body = movies.variant(
+                projection,
+                lambda: fast_json.dumps(
+                    {**movies.data, "results": project(results, projection)}
+                ),
+            )
+        return json_response(body, request, movies, projection)
     except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -133,85 +536,214 @@ client.set_key(APPWRITE_API_KEY)
 
 database = Databases(client)
 
+appwrite = AppwriteRepository(
+    database,
+    endpoint=APPWRITE_ENDPOINT,
+    project_id=APPWRITE_PROJECT_ID,
+    database_id=APPWRITE_DATABASE_ID,
+    max_workers=APPWRITE_MAX_WORKERS,
+    max_concurrency=APPWRITE_MAX_CONCURRENCY,
+    timeout=APPWRITE_TIMEOUT,
+)
 
-def update_search_count(search_term: str, movie: Movie):
-    try:
-        result = database.list_documents(
-            APPWRITE_DATABASE_ID,
+
+trending_leaderboard = TrendingLeaderboard(capacity=TRENDING_CAPACITY)
+trending_reconciles = SingleFlight()
+
+
+def trending_entry(doc: dict) -> dict:
+    title = None
+    if doc.get("movie_json"):
+        try:
+            title = json.loads(doc["movie_json"]).get("title")
+        except ValueError:
+            pass
+    return {
+        "search_term": doc["search_term"],
+        "count": doc["count"],
+        "movie_id": doc["movie_id"],
+        "title": title,
+        "poster_url": doc.get("poster_url") or "/no-movie.png",
+    }
+
+
+async def write_search_counts(batch: SearchCountBatch, written: list[dict]):
+    """Write the batch term by term, appending each written document's trending
+    entry to ``written``. A failure part way raises PartialFlushError."""
+    search_terms = list(batch.keys())
+    existing = {}
+    for start in range(0, len(search_terms), APPWRITE_MAX_QUERY_VALUES):
+        chunk = search_terms[start : start + APPWRITE_MAX_QUERY_VALUES]
+        result = await appwrite.list_documents(
             APPWRITE_COLLECTION_ID,
-            [Query.equal("search_term", search_term)],
+            [Query.equal("search_term", chunk), Query.limit(len(chunk))],
         )
-        documents = result["documents"]
-        if len(documents) > 0:
-            doc = documents[0]
-            database.update_document(
-                APPWRITE_DATABASE_ID,
-                APPWRITE_COLLECTION_ID,
-                doc["$id"],
-                {"count": doc["count"] + 1},
-            )
-        else:
-            poster_url = (
-                f"https://image.tmdb.org/t/p/w500{movie['poster_path']}"
-                if movie.get("poster_path")
-                else "/no-movie.png"
-            )
-            database.create_document(
-                APPWRITE_DATABASE_ID,
-                APPWRITE_COLLECTION_ID,
-                "unique()",
-                {
-                    "search_term": search_term,
-                    "count": 1,
-                    "movie_id": movie["id"],
-                    "poster_url": poster_url,
-                    "movie_json": json.dumps(movie),
-                },
-            )
-        print("Search count updated successfully")
+        for doc in result["documents"]:
+            existing[doc["search_term"]] = doc
+
+    written_terms = set()
+    try:
+        for search_term, (increment, movie) in batch.items():
+            doc = existing.get(search_term)
+            if doc is not None:
+                written_doc = await appwrite.update_document(
+                    APPWRITE_COLLECTION_ID,
+                    doc["$id"],
+                    {"count": doc["count"] + increment},
+                )
+            else:
+                poster_url = (
+                    f"https://image.tmdb.org/t/p/w500{movie['poster_path']}"
+                    if movie.get("poster_path")
+                    else "/no-movie.png"
+                )
+                written_doc = await appwrite.create_document(
+                    APPWRITE_COLLECTION_ID,
+                    {
+                        "search_term": search_term,
+                        "count": increment,
+                        "movie_id": movie["id"],
+                        "poster_url": poster_url,
+                        "movie_json": json.dumps(movie),
+                    },
+                )
+            written_terms.add(search_term)
+            written.append(trending_entry(written_doc))
     except Exception as e:
-        print("Error updating search count:", e)
+        raise PartialFlushError(written_terms, e) from e
+    logger.info(f"Search counts updated for {len(batch)} terms")
 
 
-# TODO: response_model
-@app.get("/api/movies/trending")
-def get_trending_movies():
+async def flush_search_counts(batch: SearchCountBatch):
+    written = []
     try:
-        result = database.list_documents(
-            APPWRITE_DATABASE_ID,
-            APPWRITE_COLLECTION_ID,
-            [Query.order_desc("count"), Query.limit(5)],
+        await write_search_counts(batch, written)
+    finally:
+        # Terms written before a failure still count for trending
+        trending_leaderboard.update(written)
+
+
+search_counts = SearchCountAggregator(
+    flush_search_counts,
+    flush_interval=SEARCH_COUNT_FLUSH_INTERVAL,
+    batch_size=SEARCH_COUNT_BATCH_SIZE,
+    max_pending=SEARCH_COUNT_MAX_PENDING,
+)
+
+
+async def reconcile_trending():
+    result = await appwrite.list_documents(
+        APPWRITE_COLLECTION_ID,
+        [Query.order_desc("count"), Query.limit(TRENDING_CAPACITY)],
+    )
+    entries = [trending_entry(doc) for doc in result["documents"]]
+    trending_leaderboard.replace(entries)
+    for entry in entries:
+        suggest_index.add(entry["movie_id"], entry["title"])
+
+
+async def reconcile_trending_periodically():
+    while True:
+        await asyncio.sleep(TRENDING_RECONCILE_INTERVAL)
+        try:
+            await trending_reconciles.do("trending", reconcile_trending)
+        except Exception as e:
+            logger.error(f"Error reconciling trending movies: {e}")
+
+
+class TrendingMovie(BaseModel):
+    search_term: str
+    count: int
+    movie_id: int
+    title: str | None
+    poster_url: str
+
+
+class TrendingResponse(BaseModel):
+    movies: list[TrendingMovie]
+    updated_at: float | None
+    reconciled_at: float | None
+
+
+TRENDING_FIELDS = tuple(TrendingMovie.model_fields)
+
+
+@app.get("/api/movies/trending", response_model=TrendingResponse)
+async def get_trending_movies(request: Request, fields: str | None = None):
+    projection = parse_fields(fields, TRENDING_FIELDS, None)
+    try:
+        if not trending_leaderboard.is_loaded():
+            await trending_reconciles.do("trending", reconcile_trending)
+        movies = [
+            TrendingMovie.model_validate(entry).model_dump()
+            for entry in trending_leaderboard.top(TRENDING_LIMIT)
+        ]
+        body = fast_json.dumps(
+            {
+                "movies": project(movies, projection),
+                "updated_at": trending_leaderboard.updated_at,
+                "reconciled_at": trending_leaderboard.reconciled_at,
+            }
         )
-        movies = result["documents"]
-        return movies
+        return json_response(body, request)
     except Exception as e:
-        print("Error fetching trending movies:", e)
+        logger.error(f"Error fetching trending movies: {e}")
         raise HTTPException(status_code=500, detail="Error fetching trending movies")
 
 
-def test_jwt(jwt: str):
-    try:
-        # Initialize Appwrite client
-        client = Client()
-        client.set_endpoint(APPWRITE_ENDPOINT)
-        client.set_project(APPWRITE_PROJECT_ID)
-        client.set_jwt(jwt)  # Set the JWT for this request
+class Suggestion(BaseModel):
+    id: int
+    title: str
+    popularity: float
+    poster_path: str | None
+
+
+class SuggestResponse(BaseModel):
+    query: str
+    results: list[Suggestion]
+
+
+@app.get("/api/movies/suggest", response_model=SuggestResponse)
+async def suggest_movies(
+    q: str = QueryParam(..., min_length=1, max_length=100),
+    limit: int = QueryParam(10, ge=1, le=50),
+):
+    """Titles starting with ``q``, answered from titles already seen"""
+    body = fast_json.dumps({"query": q, "results": suggest_index.suggest(q, limit)})
+    return Response(body, media_type="application/json")
+
+
+jwt_cache = JWTCache(
+    maxsize=JWT_CACHE_MAXSIZE,
+    max_ttl=JWT_CACHE_MAX_TTL,
+    negative_ttl=JWT_CACHE_NEGATIVE_TTL,
+)
+
 
-        # Get account service
-        account = Account(client)
+async def test_jwt(jwt: str):
+    cached = jwt_cache.get(jwt)
+    if cached is INVALID:
+        raise Exception("Invalid JWT")
+    if cached is not None:
+        return cached
 
+    try:
         # Get user account (this validates the JWT)
-        user = account.get()
+        user = await appwrite.get_account(jwt)
 
-        print(f"User ID: {user['$id']}")
+        logger.debug(f"User ID: {user['$id']}")
+        jwt_cache.set_valid(jwt, user["$id"])
         return user["$id"]
 
     except AppwriteException as e:
-        print(f"Appwrite validation failed: {e.message}")
+        logger.warning(f"Appwrite validation failed: {e.message}")
+        # Only remember real rejections, not transient Appwrite failures
+        if e.code == 401:
+            jwt_cache.set_invalid(jwt)
         raise Exception("Invalid JWT")
 
 
-def get_current_user_id(request: Request):
+def get_bearer_token(request: Request) -> str:
     auth_header = request.headers.get("Authorization")
 
     if not auth_header or not auth_header.startswith("Bearer "):
@@ -219,13 +751,23 @@ def get_current_user_id(request: Request):
             status_code=401, detail="Missing or invalid Authorization header"
         )
 
-    jwt = auth_header.split(" ")[1]
+    return auth_header.split(" ")[1]
+
+
+async def get_current_user_id(request: Request):
+    jwt = get_bearer_token(request)
     try:
-        return test_jwt(jwt)
+        return await test_jwt(jwt)
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
 
 
+@app.post("/api/logout")
+async def logout(jwt: str = Depends(get_bearer_token)):
+    jwt_cache.evict(jwt)
+    return {"message": "Logged out"}
+
+
 class FavoriteMovie(BaseModel):
     id: int
     title: str
@@ -238,34 +780,104 @@ class FavoriteMovie(BaseModel):
 
 class FavoriteResponse(BaseModel):
     favorites: list[FavoriteMovie]
+    # Only set for paginated requests, pass it back as ``cursor`` for the next page
+    next_cursor: str | None = None
 
 
-@app.get("/api/favorites", response_model=FavoriteResponse)
-async def get_favorites(request: Request, user_id: str = Depends(get_current_user_id)):
+favorites_cache = FavoritesCache(
+    maxsize=FAVORITES_CACHE_MAXSIZE, ttl=FAVORITES_CACHE_TTL
+)
+
+
+def favorite_from_document(doc: dict) -> dict:
+    return {
+        "id": doc["movie_id"],
+        "title": doc["title"],
+        "vote_average": doc.get("vote_average", 0),
+        "poster_path": doc.get("poster_path", "") or "",
+        "release_date": doc.get("release_date", "") or "",
+        "original_language": doc.get("original_language", "unknown") or "",
+        "ranking": doc.get("ranking", 0),
+    }
+
+
+async def list_favorite_documents(
+    user_id: str, limit: int, cursor: str | None = None
+) -> list[dict]:
+    queries = [Query.equal("user_id", user_id), Query.limit(limit)]
+    if cursor:
+        queries.append(Query.cursor_after(cursor))
+    result = await appwrite.list_documents(APPWRITE_FAVORITES_COLLECTION_ID, queries)
+    return result["documents"]
+
+
+async def iter_favorite_pages(user_id: str):
+    """Yield the user's favorites page by page using Appwrite cursors"""
+    cursor = None
+    while True:
+        documents = await list_favorite_documents(user_id, FAVORITES_PAGE_SIZE, cursor)
+        if documents:
+            yield [favorite_from_document(doc) for doc in documents]
+        if len(documents) < FAVORITES_PAGE_SIZE:
+            return
+        cursor = documents[-1]["$id"]
+
+
+async def stream_favorites(user_id: str):
     try:
-        result = database.list_documents(
-            APPWRITE_DATABASE_ID,
-            "685996b7001270f656eb",
-            [Query.equal("user_id", user_id)],
+        async for page in iter_favorite_pages(user_id):
+            yield "".join(json.dumps(movie) + "\n" for movie in page)
+    except Exception as e:
+        logger.error(f"Error streaming favorites: {e}")
+        # The 200 is already sent, a last record tells the client it's cut short
+        yield json.dumps({"error": "Error fetching favorites"}) + "\n"
+
+
+@app.get("/api/favorites", response_model=FavoriteResponse)
+async def get_favorites(
+    request: Request,
+    response: Response,
+    limit: int | None = QueryParam(None, ge=1, le=FAVORITES_PAGE_SIZE),
+    cursor: str | None = None,
+    stream: bool = False,
+    user_id: str = Depends(get_current_user_id),
+):
+    if stream:
+        # One JSON favorite per line, sent as each Appwrite page arrives
+        return StreamingResponse(
+            stream_favorites(user_id), media_type="application/x-ndjson"
         )
 
-        movies = []
-        for doc in result["documents"]:
-            movie = {
-                "id": doc["movie_id"],
-                "title": doc["title"],
-                "vote_average": doc.get("vote_average", 0),
-                "poster_path": doc.get("poster_path", "") or "",
-                "release_date": doc.get("release_date", "") or "",
-                "original_language": doc.get("original_language", "unknown") or "",
-                "ranking": doc.get("ranking", 0),
+    try:
+        if limit is not None or cursor is not None:
+            page_size = limit or FAVORITES_PAGE_SIZE
+            documents = await list_favorite_documents(user_id, page_size, cursor)
+            return {
+                "favorites": [favorite_from_document(doc) for doc in documents],
+                "next_cursor": (
+                    documents[-1]["$id"] if len(documents) == page_size else None
+                ),
             }
-            movies.append(movie)
 
-        print(f"Found {len(movies)} favorites for user {user_id}")
+        cached = favorites_cache.get(user_id)
+        if cached is None:
+            generation = favorites_cache.generation()
+            movies = []
+            async for page in iter_favorite_pages(user_id):
+                movies.extend(page)
+            etag = favorites_cache.set(user_id, movies, generation)
+            logger.info(f"Found {len(movies)} favorites for user {user_id}")
+        else:
+            movies, etag = cached
+
+        # The browser revalidates with If-None-Match instead of reusing blindly
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in request.headers.get("If-None-Match", ""):
+            return Response(status_code=304, headers=cache_headers)
+        response.headers.update(cache_headers)
         return {"favorites": movies}
     except Exception as e:
-        print("Error fetching favorites:", e)
+        logger.error(f"Error fetching favorites: {e}")
     return {"favorites": []}
 
 
@@ -283,6 +895,19 @@ class FavoritePostRequestBody(BaseModel):
     movie: FavoriteMoviePost
 
 
+def favorite_document(user_id: str, movie: FavoriteMoviePost) -> dict:
+    return {
+        "user_id": user_id,
+        "movie_id": movie.id,
+        "title": movie.title,
+        "vote_average": movie.vote_average,
+        "poster_path": movie.poster_path,
+        "release_date": movie.release_date,
+        "original_language": movie.original_language,
+        "ranking": movie.ranking,
+    }
+
+
 @app.post("/api/favorites")
 async def add_favorite(
     request: Request,
@@ -292,36 +917,25 @@ async def add_favorite(
     try:
         movie = body.movie  # This is a FavoriteMoviePost object
 
-        existing = database.list_documents(
-            APPWRITE_DATABASE_ID,
-            "685996b7001270f656eb",
+        existing = await appwrite.list_documents(
+            APPWRITE_FAVORITES_COLLECTION_ID,
             [Query.equal("user_id", user_id), Query.equal("movie_id", movie.id)],
         )
 
         if len(existing["documents"]) > 0:
-            print("Movie already in favorites")
+            logger.info("Movie already in favorites")
             return {"message": "Movie already in favorites"}
 
-        new_favorite = {
-            "user_id": user_id,
-            "movie_id": movie.id,
-            "title": movie.title,
-            "vote_average": movie.vote_average,
-            "poster_path": movie.poster_path,
-            "release_date": movie.release_date,
-            "original_language": movie.original_language,
-            "ranking": movie.ranking,
-        }
-
-        created_doc = database.create_document(
-            APPWRITE_DATABASE_ID, "685996b7001270f656eb", "unique()", new_favorite
+        created_doc = await appwrite.create_document(
+            APPWRITE_FAVORITES_COLLECTION_ID, favorite_document(user_id, movie)
         )
 
-        print(f"Added favorite: {movie.title}")
+        favorites_cache.add(user_id, favorite_from_document(created_doc))
+        logger.info(f"Added favorite: {movie.title}")
         return {"message": "Movie added to favorites", "document": created_doc}
 
     except Exception as e:
-        print("Error adding movie:", e)
+        logger.error(f"Error adding movie: {e}")
     return {"error": "Something went wrong"}
 
 
@@ -343,30 +957,143 @@ async def remove_favorite(
         movie = body.movie
 
         # Find the document to delete
-        result = database.list_documents(
-            APPWRITE_DATABASE_ID,
-            "685996b7001270f656eb",
+        result = await appwrite.list_documents(
+            APPWRITE_FAVORITES_COLLECTION_ID,
             [Query.equal("user_id", user_id), Query.equal("movie_id", movie.id)],
         )
 
         if len(result["documents"]) == 0:
-            print("Movie not found in favorites")
+            logger.info("Movie not found in favorites")
             return {"message": "Movie not found in favorites"}
 
         # Delete the document
         document_to_delete = result["documents"][0]
-        database.delete_document(
-            APPWRITE_DATABASE_ID, "685996b7001270f656eb", document_to_delete["$id"]
+        await appwrite.delete_document(
+            APPWRITE_FAVORITES_COLLECTION_ID, document_to_delete["$id"]
         )
 
-        print(f"Removed favorite: {movie.id}")
+        favorites_cache.remove(user_id, movie.id)
+        logger.info(f"Removed favorite: {movie.id}")
         return {"message": "Movie removed from favorites"}
 
     except Exception as e:
-        print("Error removing movie:", e)
+        logger.error(f"Error removing movie: {e}")
     return {"error": "Something went wrong"}
 
 
+class BulkFavoriteOperation(BaseModel):
+    action: Literal["add", "remove"]
+    movie: FavoriteMoviePost | FavoriteMovieDelete
+
+
+class BulkFavoritesRequestBody(BaseModel):
+    operations: list[BulkFavoriteOperation] = Field(
+        min_length=1, max_length=FAVORITES_BULK_MAX_OPERATIONS
+    )
+
+
+class BulkFavoriteResult(BaseModel):
+    id: int
+    action: Literal["add", "remove"]
+    # added, removed, already_exists, not_found, duplicate or error
+    status: str
+    error: str | None = None
+
+
+class BulkFavoritesResponse(BaseModel):
+    results: list[BulkFavoriteResult]
+
+
+async def find_favorite_documents(
+    user_id: str, movie_ids: list[int]
+) -> dict[int, dict]:
+    """Look up which of the movies the user already has, in as few queries as possible"""
+    existing = {}
+    for start in range(0, len(movie_ids), APPWRITE_MAX_QUERY_VALUES):
+        chunk = movie_ids[start : start + APPWRITE_MAX_QUERY_VALUES]
+        result = await appwrite.list_documents(
+            APPWRITE_FAVORITES_COLLECTION_ID,
+            [
+                Query.equal("user_id", user_id),
+                Query.equal("movie_id", chunk),
+                Query.limit(len(chunk)),
+            ],
+        )
+        for doc in result["documents"]:
+            existing[doc["movie_id"]] = doc
+    return existing
+
+
+@app.post("/api/favorites/bulk", response_model=BulkFavoritesResponse)
+async def bulk_update_favorites(
+    body: BulkFavoritesRequestBody,
+    user_id: str = Depends(get_current_user_id),
+):
+    operations = body.operations
+    # Only the first operation for a movie is applied, later ones are reported
+    first_operations = {}
+    for index, operation in enumerate(operations):
+        first_operations.setdefault(operation.movie.id, index)
+
+    try:
+        existing = await find_favorite_documents(user_id, list(first_operations))
+    except Exception as e:
+        logger.error(f"Error checking favorites: {e}")
+        raise HTTPException(status_code=502, detail="Error checking favorites")
+
+    semaphore = asyncio.Semaphore(FAVORITES_BULK_CONCURRENCY)
+
+    async def apply(operation: BulkFavoriteOperation) -> dict:
+        movie = operation.movie
+        result = {"id": movie.id, "action": operation.action}
+        try:
+            if operation.action == "add":
+                if movie.id in existing:
+                    return {**result, "status": "already_exists"}
+                if not isinstance(movie, FavoriteMoviePost):
+                    return {**result, "status": "error", "error": "title is required"}
+                async with semaphore:
+                    created_doc = await appwrite.create_document(
+                        APPWRITE_FAVORITES_COLLECTION_ID,
+                        favorite_document(user_id, movie),
+                    )
+                favorites_cache.add(user_id, favorite_from_document(created_doc))
+                return {**result, "status": "added"}
+
+            document = existing.get(movie.id)
+            if document is None:
+                return {**result, "status": "not_found"}
+            async with semaphore:
+                await appwrite.delete_document(
+                    APPWRITE_FAVORITES_COLLECTION_ID, document["$id"]
+                )
+            favorites_cache.remove(user_id, movie.id)
+            return {**result, "status": "removed"}
+        except Exception as e:
+            logger.error(f"Error applying {operation.action} for movie {movie.id}: {e}")
+            return {**result, "status": "error", "error": "Something went wrong"}
+
+    applied = await asyncio.gather(
+        *(apply(operations[index]) for index in first_operations.values())
+    )
+    applied_by_index = dict(zip(first_operations.values(), applied))
+
+    results = []
+    for index, operation in enumerate(operations):
+        if index in applied_by_index:
+            results.append(applied_by_index[index])
+        else:
+            results.append(
+                {
+                    "id": operation.movie.id,
+                    "action": operation.action,
+                    "status": "duplicate",
+                }
+            )
+    logger.info(f"Applied {len(applied)} bulk favorite operations for user {user_id}")
+    return {"results": results}
+
+
 # websockets
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str, jwt: str):
@@ -385,24 +1112,36 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, jwt: str):
         return
 
     try:
-        test_jwt(jwt)
+        await test_jwt(jwt)
     except Exception as e:
         logger.error(f"WebSocket connection failed: {str(e)}")
         await websocket.close(code=1008, reason=str(e))
         return
 
-    await manager.connect(websocket, user_id)
+    codec = negotiate(websocket.scope.get("subprotocols", []))
+    connection = await manager.connect(websocket, user_id, codec)
     try:
         while True:
-            data = await websocket.receive_text()
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            data = (
+                frame.get("text")
+                if frame.get("text") is not None
+                else frame.get("bytes")
+            )
+            connection.touch()
             try:
-                message = json.loads(data)
+                message = codec.decode(data)
                 message_type = message.get("type")
                 if message_type == "ping":
-                    await manager.send_personal_message(
-                        {"type": "pong", "timestamp": message.get("timestamp")}, user_id
+                    await manager.send_to_connection(
+                        {"type": "pong", "timestamp": message.get("timestamp")},
+                        connection,
                     )
-
+                elif message_type == "pong":
+                    # Reply to the server heartbeat, touch() already recorded it
+                    pass
                 elif message_type == "favorite_movie":
                     movie = message.get("movie")
                     user_name = message.get("user_name", "Unknown User")
@@ -410,25 +1149,110 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, jwt: str):
                         await manager.handle_favorite_action(user_id, movie, user_name)
                 else:
                     logger.warning(f"Unknown message type: {message_type}")
-                    await manager.send_personal_message(
-                        {"error": "Unknown message type"}, user_id
+                    await manager.send_to_connection(
+                        {"error": "Unknown message type"}, connection
                     )
-            except json.JSONDecodeError:
-                logger.error(f"Invalid JSON received from {user_id}: {data}")
+            except ValueError:
+                logger.error(f"Invalid {codec.name} received from {user_id}: {data!r}")
             except Exception as e:
                 logger.error(f"Error processing message from {user_id}: {e}")
     except WebSocketDisconnect:
-        await manager.disconnect(user_id)
+        await manager.disconnect(user_id, connection)
+
+
+if PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        directory=PROFILING_DIR,
+        token=PROFILING_TOKEN,
+        max_per_minute=PROFILING_MAX_PER_MINUTE,
+        keep=PROFILING_KEEP,
+    )
+    logger.info(f"Request profiling enabled, profiles are saved to {PROFILING_DIR}")
+
+loop_lag = LoopLagMonitor(EVENT_LOOP_LAG_INTERVAL)
+
+# Read from the components' own counters when scraped
+metrics.callback(
+    "ws_connections",
+    "Open WebSocket connections",
+    lambda: manager.connections.connection_count,
+)
+metrics.callback(
+    "ws_connected_users",
+    "Users with at least one WebSocket connection",
+    lambda: manager.connections.user_count,
+)
+metrics.callback(
+    "ws_messages_sent_total",
+    "WebSocket frames written",
+    lambda: manager.messages_sent,
+    kind="counter",
+)
+metrics.callback(
+    "ws_send_failures_total",
+    "WebSocket sends that failed",
+    lambda: manager.send_failures,
+    kind="counter",
+)
+metrics.callback(
+    "ws_dropped_messages_total",
+    "Messages dropped by full send queues",
+    lambda: manager.dropped_messages,
+    kind="counter",
+)
+metrics.callback(
+    "ws_reaped_connections_total",
+    "Idle WebSocket connections closed by the heartbeat",
+    lambda: manager.reaped_connections,
+    kind="counter",
+)
+metrics.callback(
+    "search_counts_pending_terms",
+    "Search terms waiting to be written to Appwrite",
+    lambda: search_counts.stats()["pending_terms"],
+)
+metrics.callback(
+    "search_counts_pending_increments",
+    "Search count increments waiting to be written to Appwrite",
+    lambda: search_counts.stats()["pending_increments"],
+)
+metrics.callback(
+    "search_counts_dropped_increments_total",
+    "Search count increments dropped because the queue was full",
+    lambda: search_counts.dropped_increments,
+    kind="counter",
+)
 
 
-@app.get("/api/ws/status")
-async def websocket_status():
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/api/cache/status")
+async def cache_status():
     return {
-        "active_connections": len(manager.active_connections),
-        "connected_users": list(manager.active_connections.keys()),
+        "movies": movies_cache.stats(),
+        "tmdb_requests": tmdb_requests.stats(),
+        "jwt": jwt_cache.stats(),
+        "favorites": favorites_cache.stats(),
+        "movies_prefetch": movies_prefetcher.stats(),
+        "suggest_index": suggest_index.stats(),
+        "movies_disk": movies_disk_cache.stats() if movies_disk_cache else None,
     }
 
 
+@app.get("/api/search-counts/status")
+async def search_counts_status():
+    return search_counts.stats()
+
+
+@app.get("/api/ws/status")
+async def websocket_status():
+    return {**manager.stats(), "encodings": available_encodings()}
+
+
 if __name__ == "__main__":
     # Cloud Run sets PORT environment variable
     port = int(os.environ.get("PORT", 8080))
@@ -437,4 +1261,11 @@ if __name__ == "__main__":
     logger.warning("This is a warning message.")
     logger.error("This is an error message.")
     logger.critical("This is a critical message.")
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=port,
+        ws_ping_interval=WS_PING_INTERVAL,
+        ws_ping_timeout=WS_PING_TIMEOUT,
+        ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE,
+    )
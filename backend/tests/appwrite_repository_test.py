@@ -0,0 +1,59 @@
+import sys
+import os
+import asyncio
+import time
+from unittest.mock import MagicMock
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from appwrite_repository import AppwriteRepository
+
+
+def make_repository(database, **kwargs):
+    return AppwriteRepository(
+        database,
+        endpoint="http://mock-appwrite.com",
+        project_id="project",
+        database_id="db",
+        **kwargs,
+    )
+
+
+def test_calls_run_off_the_event_loop():
+    database = MagicMock()
+    database.list_documents.side_effect = lambda *args: time.sleep(0.1) or {
+        "documents": []
+    }
+    repository = make_repository(database)
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            for _ in range(5):
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        result, _ = await asyncio.gather(
+            repository.list_documents("collection", []), tick()
+        )
+        return result, ticks
+
+    result, ticks = asyncio.run(run())
+    repository.close()
+
+    assert result == {"documents": []}
+    assert ticks == 5
+    database.list_documents.assert_called_once_with("db", "collection", [])
+
+
+def test_slow_calls_time_out():
+    database = MagicMock()
+    database.delete_document.side_effect = lambda *args: time.sleep(0.2)
+    repository = make_repository(database, timeout=0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(repository.delete_document("collection", "doc-1"))
+    repository.close()
@@ -0,0 +1,67 @@
+import sys
+import os
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from appwrite.query import Query
+from benchmarks.fake_upstreams import create_appwrite_app, create_tmdb_app
+from benchmarks.run import summarize
+
+DOCUMENTS = "/v1/databases/db/collections/favorites/documents"
+
+
+def queries(*items: str) -> dict:
+    return {f"queries[{i}]": item for i, item in enumerate(items)}
+
+
+def test_summarize_reports_rate_and_percentiles():
+    summary = summarize([i / 1000 for i in range(1, 101)], elapsed=2.0, errors=1)
+
+    assert summary["requests"] == 100
+    assert summary["errors"] == 1
+    assert summary["rps"] == 50.0
+    assert summary["p50_ms"] == 51.0
+    assert summary["p99_ms"] == 99.0
+
+
+def test_fake_tmdb_pages_results():
+    client = TestClient(create_tmdb_app(latency=0))
+
+    data = client.get("/3/search/movie", params={"query": "alien", "page": 2}).json()
+
+    assert data["page"] == 2
+    assert data["results"][0]["id"] == 21
+    assert data["results"][0]["title"] == "Alien Movie 21"
+
+
+def test_fake_appwrite_stores_and_queries_documents():
+    client = TestClient(create_appwrite_app(latency=0))
+    for user, movie in [("a", 1), ("a", 2), ("b", 3)]:
+        client.post(
+            DOCUMENTS,
+            json={
+                "documentId": "unique()",
+                "data": {"user_id": user, "movie_id": movie},
+            },
+        )
+
+    first = client.get(
+        DOCUMENTS, params=queries(Query.equal("user_id", "a"), Query.limit(1))
+    ).json()["documents"]
+    rest = client.get(
+        DOCUMENTS,
+        params=queries(
+            Query.equal("user_id", "a"), Query.cursor_after(first[0]["$id"])
+        ),
+    ).json()["documents"]
+    client.delete(f"{DOCUMENTS}/{rest[0]['$id']}")
+    remaining = client.get(DOCUMENTS, params=queries(Query.equal("user_id", "a")))
+
+    assert [doc["movie_id"] for doc in first + rest] == [1, 2]
+    assert [doc["movie_id"] for doc in remaining.json()["documents"]] == [1]
+    assert client.get("/v1/account").status_code == 401
+    assert client.get("/v1/account", headers={"X-Appwrite-JWT": "u1"}).json() == {
+        "$id": "u1",
+        "name": "u1",
+    }
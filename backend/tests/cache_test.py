@@ -0,0 +1,63 @@
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.cache import TTLCache, FRESH, STALE
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "a" becomes most recently used
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.stats()["evictions"] == 1
+
+
+@patch("utils.cache.time.monotonic")
+def test_fresh_stale_and_expired(mock_monotonic):
+    cache = TTLCache(maxsize=10, ttl=10, stale_ttl=5)
+    mock_monotonic.return_value = 100
+    cache.set("key", "value")
+
+    mock_monotonic.return_value = 105
+    assert cache.get("key") == ("value", FRESH)
+
+    mock_monotonic.return_value = 112
+    assert cache.get("key") == ("value", STALE)
+
+    mock_monotonic.return_value = 120
+    assert cache.get("key") == (None, None)
+    assert "key" not in cache
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["stale_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_only_one_refresh_per_key():
+    cache = TTLCache()
+    assert cache.begin_refresh("key")
+    assert not cache.begin_refresh("key")
+
+    cache.set("key", "new value")
+    assert cache.begin_refresh("key")
+
+
+@patch("utils.cache.time.monotonic")
+def test_per_entry_ttl(mock_monotonic):
+    cache = TTLCache(maxsize=10, ttl=60)
+    mock_monotonic.return_value = 100
+    cache.set("short", "value", ttl=5)
+    cache.set("default", "value")
+
+    mock_monotonic.return_value = 110
+    assert cache.get("short") == (None, None)
+    assert cache.get("default") == ("value", FRESH)
@@ -0,0 +1,38 @@
+import sys
+import os
+import gzip
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import compression
+from utils.compression import choose_encoding, compress
+
+
+def test_choose_encoding_honours_quality(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+
+    assert choose_encoding(None) is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("gzip;q=0, br") is None
+    assert choose_encoding("*") == "gzip"
+
+
+def test_choose_encoding_prefers_brotli_when_available(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", object())
+
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+
+
+def test_gzip_output_is_stable():
+    body = b'{"results":[]}' * 100
+
+    assert compress(body, "gzip") == compress(body, "gzip")
+    assert gzip.decompress(compress(body, "gzip")) == body
+
+
+def test_brotli_round_trip():
+    body = b'{"results":[]}' * 100
+
+    assert compression.brotli.decompress(compress(body, "br")) == body
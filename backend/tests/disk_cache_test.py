@@ -0,0 +1,79 @@
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.disk_cache import DiskCache
+
+
+def test_entries_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "cache" / "tmdb.sqlite3")
+
+    async def run():
+        writer = DiskCache(path)
+        reader = DiskCache(path)
+        try:
+            await writer.set("a", b'{"page":1}')
+            return await reader.get("a"), await reader.get("b"), reader.stats()
+        finally:
+            writer.close()
+            reader.close()
+
+    body, missing, stats = asyncio.run(run())
+
+    assert body == b'{"page":1}'
+    assert missing is None
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_expired_entries_are_not_served_and_get_compacted(tmp_path):
+    async def run():
+        cache = DiskCache(str(tmp_path / "tmdb.sqlite3"), ttl=-1)
+        try:
+            await cache.set("a", b"old")
+            return await cache.get("a"), await cache.compact()
+        finally:
+            cache.close()
+
+    assert asyncio.run(run()) == (None, 1)
+
+
+def test_compaction_keeps_the_newest_entries_within_budget(tmp_path):
+    async def run():
+        cache = DiskCache(str(tmp_path / "tmdb.sqlite3"), max_bytes=25, compact_every=3)
+        try:
+            for key in ("a", "b", "c"):
+                await cache.set(key, b"x" * 10)
+            return [await cache.get(key) is not None for key in ("a", "b", "c")]
+        finally:
+            cache.close()
+
+    # The third write compacted, only two bodies fit in 25 bytes
+    assert asyncio.run(run()) == [False, True, True]
+
+
+def test_errors_are_a_miss_not_a_failure(tmp_path):
+    async def run():
+        cache = DiskCache(str(tmp_path / "tmdb.sqlite3"))
+        cache.close()
+        await cache.set("a", b"body")
+        return await cache.get("a"), cache.stats()["errors"]
+
+    assert asyncio.run(run()) == (None, 2)
+
+
+def test_unusable_path_is_a_miss_not_a_failure(tmp_path):
+    not_a_directory = tmp_path / "file"
+    not_a_directory.write_text("")
+
+    async def run():
+        cache = DiskCache(str(not_a_directory / "sub" / "tmdb.sqlite3"))
+        try:
+            await cache.set("a", b"body")
+            return await cache.compact(), await cache.get("a"), cache.stats()["errors"]
+        finally:
+            cache.close()
+
+    assert asyncio.run(run()) == (0, None, 3)
@@ -0,0 +1,40 @@
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import fast_json
+from utils.fast_json import SerializedJSON
+
+
+def test_round_trip_with_and_without_orjson(monkeypatch):
+    document = {"results": [{"id": 1, "title": "Amélie", "popularity": 1.5}]}
+
+    encoded = fast_json.dumps(document)
+    monkeypatch.setattr(fast_json, "orjson", None)
+    fallback = fast_json.dumps(document)
+
+    assert json.loads(encoded) == document
+    assert (
+        fallback
+        == encoded
+        == '{"results":[{"id":1,"title":"Amélie","popularity":1.5}]}'.encode()
+    )
+    assert fast_json.loads(fallback) == document
+
+
+def test_serialized_json_builds_each_variant_once():
+    payload = SerializedJSON({"results": []})
+    builds = []
+
+    def build():
+        builds.append(1)
+        return b"variant"
+
+    first = payload.variant(("id",), build)
+    second = payload.variant(("id",), build)
+
+    assert payload.body == b'{"results":[]}'
+    assert first is second
+    assert len(builds) == 1
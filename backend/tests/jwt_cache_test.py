@@ -0,0 +1,45 @@
+import sys
+import os
+import base64
+import json
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.jwt_cache import JWTCache, INVALID, jwt_expiry
+
+
+def make_jwt(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode()
+    return f"header.{payload.rstrip('=')}.signature"
+
+
+def test_jwt_expiry_reads_exp_claim():
+    assert jwt_expiry(make_jwt(1700000000)) == 1700000000
+    assert jwt_expiry("not-a-jwt") is None
+
+
+def test_valid_token_is_cached():
+    cache = JWTCache()
+    token = make_jwt(time.time() + 600)
+    cache.set_valid(token, "user-1")
+
+    assert cache.get(token) == "user-1"
+    assert cache.get(make_jwt(time.time() + 900)) is None
+
+
+def test_expired_token_is_not_cached():
+    cache = JWTCache()
+    token = make_jwt(time.time() - 1)
+    cache.set_valid(token, "user-1")
+
+    assert cache.get(token) is None
+
+
+def test_negative_caching_and_eviction():
+    cache = JWTCache()
+    cache.set_invalid("bad-token")
+    assert cache.get("bad-token") is INVALID
+
+    cache.evict("bad-token")
+    assert cache.get("bad-token") is None
@@ -0,0 +1,35 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.leaderboard import TrendingLeaderboard
+
+
+def entry(search_term, count):
+    return {"search_term": search_term, "count": count}
+
+
+def test_top_is_ordered_by_count():
+    leaderboard = TrendingLeaderboard()
+    leaderboard.replace([entry("a", 1), entry("b", 5), entry("c", 3)])
+
+    assert [e["search_term"] for e in leaderboard.top(2)] == ["b", "c"]
+    assert leaderboard.is_loaded()
+
+
+def test_update_overrides_counts_and_keeps_capacity():
+    leaderboard = TrendingLeaderboard(capacity=2)
+    leaderboard.replace([entry("a", 1), entry("b", 5)])
+    leaderboard.update([entry("a", 8), entry("c", 3)])
+
+    assert leaderboard.top(5) == [entry("a", 8), entry("b", 5)]
+    assert len(leaderboard) == 2
+
+
+def test_update_does_not_mark_as_reconciled():
+    leaderboard = TrendingLeaderboard()
+    leaderboard.update([entry("a", 1)])
+
+    assert not leaderboard.is_loaded()
+    assert leaderboard.updated_at is not None
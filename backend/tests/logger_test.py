@@ -0,0 +1,56 @@
+import sys
+import os
+import json
+import logging
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import logger as log_module
+from utils.logger import SAMPLED, JSONFormatter, SamplingFilter, setup_colored_logging
+
+
+def make_record(msg: str, *args, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_sampling_filter_passes_one_in_rate():
+    sampler = SamplingFilter(rate=10)
+
+    passed = [sampler.filter(make_record("sent", **SAMPLED)) for _ in range(100)]
+
+    assert sum(passed) == 10
+    assert sampler.suppressed == 90
+    assert sampler.filter(make_record("not sampled"))
+
+
+def test_json_formatter_emits_one_object_per_record():
+    line = JSONFormatter().format(make_record("Added favorite: %s", "Alien"))
+
+    entry = json.loads(line)
+    assert entry["level"] == "INFO"
+    assert entry["message"] == "Added favorite: Alien"
+    assert "time" in entry
+
+
+def test_records_are_written_by_the_listener_thread():
+    logger = setup_colored_logging()
+    records = []
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+
+    collector = Collect()
+    listener = log_module._listener
+    listener.handlers += (collector,)
+    try:
+        logger.info("queued %s", "message")
+        # Stopping drains the queue before the thread exits
+        listener.stop()
+    finally:
+        listener.handlers = tuple(h for h in listener.handlers if h is not collector)
+        listener.start()
+
+    assert [record.getMessage() for record in records] == ["queued message"]
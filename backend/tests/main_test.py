@@ -1,6 +1,8 @@
 from fastapi.testclient import TestClient
 import sys
 import os
+import asyncio
+import json
 from unittest.mock import patch, MagicMock, AsyncMock
 import httpx
 import pytest
@@ -22,11 +24,46 @@ mock_env = {
 with patch(
     "os.getenv", side_effect=lambda key, default=None: mock_env.get(key, default)
 ):
-    from main import app
+    import main
+    import appwrite_repository
+    from main import (
+        app,
+        get_tmdb_client,
+        movies_cache,
+        search_counts,
+        database,
+        trending_leaderboard,
+        flush_search_counts,
+        jwt_cache,
+        favorites_cache,
+        suggest_index,
+        FAVORITES_PAGE_SIZE,
+    )
 
 client = TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def clear_dependency_overrides():
+    movies_cache.clear()
+    trending_leaderboard.clear()
+    jwt_cache.clear()
+    favorites_cache.clear()
+    suggest_index.clear()
+    yield
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture(autouse=True)
+def no_movies_prefetch(monkeypatch):
+    # Prefetching the next page would add TMDB calls, tests that want it opt in
+    monkeypatch.setattr(main, "MOVIES_PREFETCH_ENABLED", False)
+
+
+def use_tmdb_client(mock_async_client_instance):
+    app.dependency_overrides[get_tmdb_client] = lambda: mock_async_client_instance
+
+
 def test_root():
     response = client.get("/")
     assert response.status_code == 200
@@ -74,37 +111,36 @@ def test_get_movies_without_search():
         "total_pages": 100,
         "total_results": 2000,
     }
-    with patch("httpx.AsyncClient") as mock_client:
-        mock_response = MagicMock()
-        mock_response.json.return_value = mock_tmdb_response
-        mock_response.raise_for_status.return_value = None
+    mock_response = MagicMock()
+    mock_response.content = json.dumps(mock_tmdb_response).encode()
+    mock_response.raise_for_status.return_value = None
 
-        mock_async_client_instance = AsyncMock()
-        mock_async_client_instance.get.return_value = mock_response
-        mock_client.return_value.__aenter__.return_value = mock_async_client_instance
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.return_value = mock_response
+    use_tmdb_client(mock_async_client_instance)
 
-        # Mock the threading and database update to avoid actual database calls
-        with patch("threading.Thread") as mock_thread:
-            response = client.get("/api/movies")
+    # Mock the search count aggregator to avoid actual database calls
+    with patch.object(search_counts, "record") as mock_record:
+        response = client.get("/api/movies")
 
-            assert response.status_code == 200
-            data = response.json()
-            assert "results" in data
-            assert len(data["results"]) == 2
-            assert data["results"][0]["title"] == "Test Movie 1"
-            assert data["results"][0]["id"] == 12345
-            assert data["results"][1]["title"] == "Test Movie 2"
-            assert data["results"][1]["id"] == 67890
+        assert response.status_code == 200
+        data = response.json()
+        assert "results" in data
+        assert len(data["results"]) == 2
+        assert data["results"][0]["title"] == "Test Movie 1"
+        assert data["results"][0]["id"] == 12345
+        assert data["results"][1]["title"] == "Test Movie 2"
+        assert data["results"][1]["id"] == 67890
 
-            # Verify that search count update was triggered
+        # Verify that search count update was not triggered
 
-            assert not mock_thread.called
+        assert not mock_record.called
 
-            # Verify the correct URL was called (search endpoint)
-            mock_async_client_instance.get.assert_called_once()
-            called_url = mock_async_client_instance.get.call_args[0][0]
-            assert "discover/movie" in called_url
-            assert "sort_by=popularity.desc" in called_url
+        # Verify the correct URL was called (search endpoint)
+        mock_async_client_instance.get.assert_called_once()
+        called_url = mock_async_client_instance.get.call_args[0][0]
+        assert "discover/movie" in called_url
+        assert "sort_by=popularity.desc" in called_url
 
 
 def test_get_movies_with_search():
@@ -134,36 +170,35 @@ def test_get_movies_with_search():
         "total_results": 100,
     }
 
-    with patch("httpx.AsyncClient") as mock_client:
-        mock_response = MagicMock()
-        mock_response.json.return_value = mock_tmdb_response
-        mock_response.raise_for_status.return_value = None
+    mock_response = MagicMock()
+    mock_response.content = json.dumps(mock_tmdb_response).encode()
+    mock_response.raise_for_status.return_value = None
 
-        mock_async_client_instance = AsyncMock()
-        mock_async_client_instance.get.return_value = mock_response
-        mock_client.return_value.__aenter__.return_value = mock_async_client_instance
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.return_value = mock_response
+    use_tmdb_client(mock_async_client_instance)
 
-        # Mock the threading and database update to avoid actual database calls
-        with patch("threading.Thread") as mock_thread:
-            response = client.get(f"/api/movies?search_term={search_term}")
+    # Mock the search count aggregator to avoid actual database calls
+    with patch.object(search_counts, "record") as mock_record:
+        response = client.get(f"/api/movies?search_term={search_term}")
 
-            assert response.status_code == 200
-            data = response.json()
-            assert "results" in data
-            assert len(data["results"]) == 1
-            assert data["results"][0]["title"] == "The Avengers"
-            assert data["results"][0]["id"] == 24428
+        assert response.status_code == 200
+        data = response.json()
+        assert "results" in data
+        assert len(data["results"]) == 1
+        assert data["results"][0]["title"] == "The Avengers"
+        assert data["results"][0]["id"] == 24428
 
-            # Verify that search count update was triggered
+        # Verify that search count update was triggered
 
-            assert mock_thread.called
-            assert search_term in mock_thread.call_args[1]["args"]
+        mock_record.assert_called_once()
+        assert search_term in mock_record.call_args[0]
 
-            # Verify the correct URL was called (search endpoint)
-            mock_async_client_instance.get.assert_called_once()
-            called_url = mock_async_client_instance.get.call_args[0][0]
-            assert "search/movie" in called_url
-            assert f"query={search_term}" in called_url
+        # Verify the correct URL was called (search endpoint)
+        mock_async_client_instance.get.assert_called_once()
+        called_url = mock_async_client_instance.get.call_args[0][0]
+        assert "search/movie" in called_url
+        assert f"query={search_term}" in called_url
 
 
 def test_get_movies_empty_results():
@@ -176,47 +211,679 @@ def test_get_movies_empty_results():
         "total_results": 0,
     }
 
-    with patch("httpx.AsyncClient") as mock_client:
-        mock_response = MagicMock()
-        mock_response.json.return_value = mock_tmdb_response
-        mock_response.raise_for_status.return_value = None
+    mock_response = MagicMock()
+    mock_response.content = json.dumps(mock_tmdb_response).encode()
+    mock_response.raise_for_status.return_value = None
 
-        mock_async_client_instance = AsyncMock()
-        mock_async_client_instance.get.return_value = mock_response
-        mock_client.return_value.__aenter__.return_value = mock_async_client_instance
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.return_value = mock_response
+    use_tmdb_client(mock_async_client_instance)
 
-        # Mock the threading and database update to avoid actual database calls
-        with patch("threading.Thread") as mock_thread:
-            response = client.get(f"/api/movies?search_term={search_term}")
+    # Mock the search count aggregator to avoid actual database calls
+    with patch.object(search_counts, "record") as mock_record:
+        response = client.get(f"/api/movies?search_term={search_term}")
 
-            assert response.status_code == 200
-            data = response.json()
-            assert "results" in data
-            assert len(data["results"]) == 0
+        assert response.status_code == 200
+        data = response.json()
+        assert "results" in data
+        assert len(data["results"]) == 0
 
-            # Verify that search count update was triggered
+        # Verify that search count update was not triggered
 
-            assert not mock_thread.called
+        assert not mock_record.called
 
-            # Verify the correct URL was called (search endpoint)
-            mock_async_client_instance.get.assert_called_once()
-            called_url = mock_async_client_instance.get.call_args[0][0]
-            assert "search/movie" in called_url
-            assert f"query={search_term}" in called_url
+        # Verify the correct URL was called (search endpoint)
+        mock_async_client_instance.get.assert_called_once()
+        called_url = mock_async_client_instance.get.call_args[0][0]
+        assert "search/movie" in called_url
+        assert f"query={search_term}" in called_url
 
 
 def test_get_movies_http_error():
     """Test get_movies endpoint when TMDB API returns an error"""
-    with patch("httpx.AsyncClient") as mock_client:
-        mock_async_client_instance = AsyncMock()
-        mock_async_client_instance.get.side_effect = httpx.HTTPError("API Error")
-        mock_client.return_value.__aenter__.return_value = mock_async_client_instance
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.side_effect = httpx.HTTPError("API Error")
+    use_tmdb_client(mock_async_client_instance)
 
-        response = client.get("/api/movies")
+    response = client.get("/api/movies")
 
-        assert response.status_code == 500
-        data = response.json()
-        assert "detail" in data
+    assert response.status_code == 500
+    data = response.json()
+    assert "detail" in data
 
-        # Verify that the HTTP call was attempted
-        mock_async_client_instance.get.assert_called_once()
+    # Verify that the HTTP call was attempted
+    mock_async_client_instance.get.assert_called_once()
+
+
+def test_tmdb_client_is_shared_for_app_lifespan():
+    """The pooled TMDB client is created on startup and closed on shutdown"""
+    with TestClient(app) as lifespan_client:
+        tmdb_client = app.state.tmdb_client
+        assert isinstance(tmdb_client, httpx.AsyncClient)
+        assert not tmdb_client.is_closed
+
+        lifespan_client.get("/")
+        assert app.state.tmdb_client is tmdb_client
+
+    assert tmdb_client.is_closed
+
+
+def test_get_movies_served_from_cache():
+    """Repeated searches for the same normalized term only hit TMDB once"""
+    mock_response = MagicMock()
+    mock_response.content = json.dumps({"page": 1, "results": []}).encode()
+    mock_response.raise_for_status.return_value = None
+
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.return_value = mock_response
+    use_tmdb_client(mock_async_client_instance)
+    stats_before = client.get("/api/cache/status").json()["movies"]
+
+    first = client.get("/api/movies?search_term=Matrix")
+    second = client.get("/api/movies?search_term=%20matrix%20")
+
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    mock_async_client_instance.get.assert_called_once()
+
+    stats = client.get("/api/cache/status").json()["movies"]
+    assert stats["hits"] == stats_before["hits"] + 1
+    assert stats["misses"] == stats_before["misses"] + 1
+
+
+def trending_doc(search_term, count, movie_id):
+    return {
+        "$id": f"doc-{movie_id}",
+        "search_term": search_term,
+        "count": count,
+        "movie_id": movie_id,
+        "poster_url": f"https://image.tmdb.org/t/p/w500/{movie_id}.jpg",
+        "movie_json": f'{{"id": {movie_id}, "title": "{search_term.title()}"}}',
+    }
+
+
+def test_get_trending_movies_is_served_from_memory():
+    """Trending is loaded from Appwrite once and then answered from the leaderboard"""
+    documents = [trending_doc("alien", 10, 1), trending_doc("heat", 7, 2)]
+    with patch.object(
+        database, "list_documents", return_value={"documents": documents}
+    ) as mock_list:
+        first = client.get("/api/movies/trending")
+        second = client.get("/api/movies/trending")
+
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    mock_list.assert_called_once()
+
+    data = first.json()
+    assert data["reconciled_at"] is not None
+    assert data["movies"][0] == {
+        "search_term": "alien",
+        "count": 10,
+        "movie_id": 1,
+        "title": "Alien",
+        "poster_url": "https://image.tmdb.org/t/p/w500/1.jpg",
+    }
+
+
+def test_flushed_search_counts_update_trending():
+    """Counts written by the search count flusher are reflected in trending"""
+    with patch.object(
+        database,
+        "list_documents",
+        return_value={"documents": [trending_doc("heat", 7, 2)]},
+    ):
+        client.get("/api/movies/trending")
+
+    with patch.object(
+        database,
+        "list_documents",
+        return_value={"documents": [trending_doc("heat", 7, 2)]},
+    ), patch.object(
+        database, "update_document", return_value=trending_doc("heat", 9, 2)
+    ), patch.object(
+        database, "create_document", return_value=trending_doc("alien", 1, 1)
+    ):
+        asyncio.run(
+            flush_search_counts({"heat": (2, {"id": 2}), "alien": (1, {"id": 1})})
+        )
+
+    movies = client.get("/api/movies/trending").json()["movies"]
+    assert [(movie["search_term"], movie["count"]) for movie in movies] == [
+        ("heat", 9),
+        ("alien", 1),
+    ]
+
+
+def test_failed_search_count_write_reports_written_terms():
+    """Terms written before a failure are reported so they aren't retried"""
+    with patch.object(
+        database,
+        "list_documents",
+        return_value={"documents": [trending_doc("heat", 7, 2)]},
+    ), patch.object(
+        database, "update_document", return_value=trending_doc("heat", 9, 2)
+    ), patch.object(
+        database, "create_document", side_effect=RuntimeError("appwrite down")
+    ):
+        with pytest.raises(main.PartialFlushError) as error:
+            asyncio.run(
+                flush_search_counts({"heat": (2, {"id": 2}), "alien": (1, {"id": 1})})
+            )
+
+    assert error.value.written == {"heat"}
+    assert [entry["count"] for entry in trending_leaderboard.top(10)] == [9]
+
+
+def test_search_count_lookup_stays_within_appwrite_query_limit():
+    batch = {f"term {i}": (1, {"id": i}) for i in range(150)}
+    with patch.object(
+        database, "list_documents", return_value={"documents": []}
+    ) as mock_list, patch.object(
+        database,
+        "create_document",
+        side_effect=lambda *args, **kwargs: trending_doc("x", 1, 1),
+    ):
+        asyncio.run(flush_search_counts(batch))
+
+    # Appwrite rejects equal queries with more than 100 values
+    lookups = [json.loads(call.args[2][0]) for call in mock_list.call_args_list]
+    assert [len(query["values"]) for query in lookups] == [100, 50]
+
+
+def test_jwt_validation_is_cached():
+    """A validated token is not re-checked against Appwrite until it is evicted"""
+    auth = {"Authorization": "Bearer token-1"}
+    with patch.object(appwrite_repository, "Account") as mock_account, patch.object(
+        database, "list_documents", return_value={"documents": []}
+    ):
+        mock_account.return_value.get.return_value = {"$id": "user-1"}
+
+        assert client.get("/api/favorites", headers=auth).status_code == 200
+        assert client.get("/api/favorites", headers=auth).status_code == 200
+        assert mock_account.return_value.get.call_count == 1
+
+        assert client.post("/api/logout", headers=auth).status_code == 200
+        client.get("/api/favorites", headers=auth)
+        assert mock_account.return_value.get.call_count == 2
+
+
+def test_rejected_jwt_is_negatively_cached():
+    """A token Appwrite rejected is refused without asking Appwrite again"""
+    auth = {"Authorization": "Bearer bad-token"}
+    with patch.object(appwrite_repository, "Account") as mock_account:
+        mock_account.return_value.get.side_effect = main.AppwriteException(
+            "Invalid token", code=401
+        )
+
+        assert client.get("/api/favorites", headers=auth).status_code == 401
+        assert client.get("/api/favorites", headers=auth).status_code == 401
+        assert mock_account.return_value.get.call_count == 1
+
+
+def favorite_doc(movie_id, title):
+    return {
+        "$id": f"fav-{movie_id}",
+        "user_id": "user-1",
+        "movie_id": movie_id,
+        "title": title,
+        "vote_average": 7.5,
+        "poster_path": f"/{movie_id}.jpg",
+        "release_date": "2024-01-01",
+        "original_language": "en",
+        "ranking": 1,
+    }
+
+
+def test_favorites_etag_and_write_through():
+    """Polling is answered from the cache with 304s, writes update the cached list"""
+    jwt_cache.set_valid("token-1", "user-1")
+    auth = {"Authorization": "Bearer token-1"}
+
+    with patch.object(
+        database,
+        "list_documents",
+        return_value={"documents": [favorite_doc(1, "Alien")]},
+    ) as mock_list:
+        first = client.get("/api/favorites", headers=auth)
+        etag = first.headers["ETag"]
+        assert first.status_code == 200
+        assert [movie["id"] for movie in first.json()["favorites"]] == [1]
+
+        not_modified = client.get(
+            "/api/favorites", headers={**auth, "If-None-Match": etag}
+        )
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        mock_list.assert_called_once()
+
+    with patch.object(
+        database, "list_documents", return_value={"documents": []}
+    ), patch.object(database, "create_document", return_value=favorite_doc(2, "Heat")):
+        client.post(
+            "/api/favorites", headers=auth, json={"movie": {"id": 2, "title": "Heat"}}
+        )
+
+    with patch.object(database, "list_documents") as mock_list:
+        changed = client.get("/api/favorites", headers={**auth, "If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+        assert [movie["id"] for movie in changed.json()["favorites"]] == [1, 2]
+        mock_list.assert_not_called()
+
+
+def test_favorites_loaded_during_a_write_are_not_cached():
+    """A list read before a concurrent write must not be cached with an ETag"""
+    jwt_cache.set_valid("token-1", "user-1")
+    auth = {"Authorization": "Bearer token-1"}
+
+    def list_during_write(*args, **kwargs):
+        # The user's add lands while this load is waiting on Appwrite
+        favorites_cache.add("user-1", {"id": 2, "title": "Heat"})
+        return {"documents": [favorite_doc(1, "Alien")]}
+
+    with patch.object(
+        database, "list_documents", side_effect=list_during_write
+    ) as mock_list:
+        client.get("/api/favorites", headers=auth)
+        client.get("/api/favorites", headers=auth)
+
+    assert mock_list.call_count == 2
+
+
+def paged_favorites(documents):
+    """Fake list_documents honouring Appwrite limit and cursorAfter queries"""
+
+    def list_documents(database_id, collection_id, queries):
+        parsed = [json.loads(query) for query in queries]
+        limit = next(q["values"][0] for q in parsed if q["method"] == "limit")
+        start = 0
+        for q in parsed:
+            if q["method"] == "cursorAfter":
+                ids = [doc["$id"] for doc in documents]
+                start = ids.index(q["values"][0]) + 1
+        return {"documents": documents[start : start + limit]}
+
+    return list_documents
+
+
+def test_favorites_cursor_pagination():
+    """limit and cursor return one page and the cursor of the next one"""
+    jwt_cache.set_valid("token-1", "user-1")
+    auth = {"Authorization": "Bearer token-1"}
+    documents = [favorite_doc(i, f"Movie {i}") for i in range(1, 6)]
+
+    with patch.object(
+        database, "list_documents", side_effect=paged_favorites(documents)
+    ):
+        first = client.get("/api/favorites?limit=2", headers=auth).json()
+        assert [movie["id"] for movie in first["favorites"]] == [1, 2]
+        assert first["next_cursor"] == "fav-2"
+
+        last = client.get("/api/favorites?limit=3&cursor=fav-2", headers=auth).json()
+        assert [movie["id"] for movie in last["favorites"]] == [3, 4, 5]
+
+        end = client.get("/api/favorites?limit=3&cursor=fav-5", headers=auth).json()
+        assert end == {"favorites": [], "next_cursor": None}
+
+
+def test_favorites_full_list_and_stream_follow_all_pages():
+    """Unpaginated and streamed listings are not cut off at one Appwrite page"""
+    jwt_cache.set_valid("token-1", "user-1")
+    auth = {"Authorization": "Bearer token-1"}
+    count = FAVORITES_PAGE_SIZE + 5
+    documents = [favorite_doc(i, f"Movie {i}") for i in range(count)]
+
+    with patch.object(
+        database, "list_documents", side_effect=paged_favorites(documents)
+    ):
+        full = client.get("/api/favorites", headers=auth).json()
+        assert len(full["favorites"]) == count
+
+        streamed = client.get("/api/favorites?stream=true", headers=auth)
+        assert streamed.headers["content-type"] == "application/x-ndjson"
+        lines = streamed.text.splitlines()
+        assert len(lines) == count
+        assert json.loads(lines[-1])["id"] == count - 1
+
+
+def test_favorites_stream_ends_with_an_error_record_on_failure():
+    jwt_cache.set_valid("token-1", "user-1")
+    auth = {"Authorization": "Bearer token-1"}
+    first_page = [favorite_doc(i, f"Movie {i}") for i in range(FAVORITES_PAGE_SIZE)]
+
+    with patch.object(
+        database,
+        "list_documents",
+        side_effect=[{"documents": first_page}, RuntimeError("appwrite down")],
+    ):
+        streamed = client.get("/api/favorites?stream=true", headers=auth)
+
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert len(lines) == FAVORITES_PAGE_SIZE + 1
+    assert lines[-1] == {"error": "Error fetching favorites"}
+
+
+def test_bulk_favorites_checks_membership_once():
+    """Bulk add/remove does one membership query and reports every item"""
+    jwt_cache.set_valid("token-1", "user-1")
+    auth = {"Authorization": "Bearer token-1"}
+    operations = [
+        {"action": "add", "movie": {"id": 1, "title": "Alien"}},
+        {"action": "add", "movie": {"id": 2, "title": "Heat"}},
+        {"action": "remove", "movie": {"id": 3}},
+        {"action": "remove", "movie": {"id": 4}},
+        {"action": "add", "movie": {"id": 5}},
+        {"action": "remove", "movie": {"id": 1}},
+    ]
+
+    with patch.object(
+        database,
+        "list_documents",
+        return_value={"documents": [favorite_doc(2, "Heat"), favorite_doc(3, "Ran")]},
+    ) as mock_list, patch.object(
+        database, "create_document", return_value=favorite_doc(1, "Alien")
+    ) as mock_create, patch.object(
+        database, "delete_document"
+    ) as mock_delete:
+        response = client.post(
+            "/api/favorites/bulk", headers=auth, json={"operations": operations}
+        )
+
+    assert response.status_code == 200
+    assert [(r["id"], r["status"]) for r in response.json()["results"]] == [
+        (1, "added"),
+        (2, "already_exists"),
+        (3, "removed"),
+        (4, "not_found"),
+        (5, "error"),
+        (1, "duplicate"),
+    ]
+    mock_list.assert_called_once()
+    mock_create.assert_called_once()
+    mock_delete.assert_called_once_with(
+        "mock_database_id", main.APPWRITE_FAVORITES_COLLECTION_ID, "fav-3"
+    )
+
+
+def test_bulk_favorites_lookup_is_chunked_by_query_limit(monkeypatch):
+    """Page size is a separate setting from Appwrite's 100 value limit"""
+    monkeypatch.setattr(main, "FAVORITES_PAGE_SIZE", 200)
+    jwt_cache.set_valid("token-1", "user-1")
+    auth = {"Authorization": "Bearer token-1"}
+    operations = [{"action": "remove", "movie": {"id": i}} for i in range(150)]
+
+    with patch.object(
+        database, "list_documents", return_value={"documents": []}
+    ) as mock_list:
+        response = client.post(
+            "/api/favorites/bulk", headers=auth, json={"operations": operations}
+        )
+
+    assert response.status_code == 200
+    lookups = [json.loads(call.args[2][1]) for call in mock_list.call_args_list]
+    assert [len(query["values"]) for query in lookups] == [100, 50]
+
+
+def test_metrics_exposes_route_and_upstream_series():
+    mock_response = MagicMock()
+    mock_response.content = json.dumps({"page": 1, "results": []}).encode()
+    mock_response.raise_for_status.return_value = None
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.return_value = mock_response
+    use_tmdb_client(mock_async_client_instance)
+
+    client.get("/api/movies", params={"search_term": "metrics"})
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/api/movies",status="200"}' in body
+    assert (
+        'http_request_duration_seconds_bucket{method="GET",route="/api/movies",le="+Inf"}'
+        in body
+    )
+    assert (
+        'upstream_request_duration_seconds_count{service="tmdb",operation="/3/search/movie"}'
+        in body
+    )
+    assert "ws_connections 0" in body
+    assert "search_counts_pending_terms" in body
+
+
+def test_get_movies_validates_once_per_cache_entry():
+    mock_response = MagicMock()
+    mock_response.content = json.dumps(
+        {"page": 1, "results": [{"id": 1, "title": "Alien"}]}
+    ).encode()
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.return_value = mock_response
+    use_tmdb_client(mock_async_client_instance)
+
+    with patch.object(
+        main.Movies, "model_validate", wraps=main.Movies.model_validate
+    ) as mock_validate:
+        # The movie misses required fields, so TMDB's answer is rejected
+        invalid = client.get("/api/movies", params={"search_term": "alien"})
+
+    assert invalid.status_code == 500
+    assert "Invalid TMDB response" in invalid.json()["detail"]
+    assert mock_validate.call_count == 1
+
+    mock_response.content = json.dumps({"page": 1, "results": []}).encode()
+    with patch.object(
+        main.Movies, "model_validate", wraps=main.Movies.model_validate
+    ) as mock_validate:
+        first = client.get("/api/movies", params={"search_term": "alien"})
+        second = client.get("/api/movies", params={"search_term": "alien"})
+
+    assert first.content == second.content
+    assert first.json() == {
+        "page": 1,
+        "total_pages": None,
+        "total_results": None,
+        "results": [],
+    }
+    assert first.headers["content-type"] == "application/json"
+    assert mock_validate.call_count == 1
+
+
+def tmdb_movie(movie_id: int) -> dict:
+    return {
+        "adult": False,
+        "backdrop_path": f"/backdrop{movie_id}.jpg",
+        "genre_ids": [28, 12],
+        "id": movie_id,
+        "original_language": "en",
+        "original_title": f"Movie {movie_id}",
+        "overview": "A long overview. " * 20,
+        "popularity": 10.5,
+        "poster_path": f"/poster{movie_id}.jpg",
+        "release_date": "2024-01-15",
+        "title": f"Movie {movie_id}",
+        "video": False,
+        "vote_average": 7.5,
+        "vote_count": 100,
+    }
+
+
+def test_get_movies_projects_fields():
+    mock_response = MagicMock()
+    mock_response.content = json.dumps(
+        {"page": 1, "results": [tmdb_movie(1), tmdb_movie(2)]}
+    ).encode()
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.return_value = mock_response
+    use_tmdb_client(mock_async_client_instance)
+
+    compact = client.get("/api/movies").json()["results"][0]
+    chosen = client.get("/api/movies", params={"fields": "title, id"}).json()
+    full = client.get("/api/movies", params={"fields": "all"}).json()["results"][0]
+    unknown = client.get("/api/movies", params={"fields": "id,secret"})
+
+    assert set(compact) == {
+        "id",
+        "title",
+        "vote_average",
+        "poster_path",
+        "release_date",
+        "original_language",
+    }
+    assert chosen["results"] == [
+        {"id": 1, "title": "Movie 1"},
+        {"id": 2, "title": "Movie 2"},
+    ]
+    assert full["overview"] == tmdb_movie(1)["overview"]
+    assert unknown.status_code == 400
+    for empty in ["", " , "]:
+        assert client.get("/api/movies", params={"fields": empty}).status_code == 400
+    mock_async_client_instance.get.assert_called_once()
+
+
+def test_get_movies_compresses_large_responses():
+    mock_response = MagicMock()
+    mock_response.content = json.dumps(
+        {"page": 1, "results": [tmdb_movie(i) for i in range(1, 21)]}
+    ).encode()
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.return_value = mock_response
+    use_tmdb_client(mock_async_client_instance)
+
+    compressed = client.get(
+        "/api/movies", params={"fields": "all"}, headers={"Accept-Encoding": "gzip"}
+    )
+    plain = client.get(
+        "/api/movies", params={"fields": "all"}, headers={"Accept-Encoding": "identity"}
+    )
+    small = client.get(
+        "/api/movies", params={"fields": "id"}, headers={"Accept-Encoding": "gzip"}
+    )
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert int(compressed.headers["content-length"]) < len(plain.content)
+    assert compressed.json() == plain.json()
+    assert "content-encoding" not in plain.headers
+    assert "content-encoding" not in small.headers
+
+
+def test_get_trending_movies_projects_fields():
+    trending_leaderboard.replace(
+        [
+            {
+                "search_term": "alien",
+                "count": 10,
+                "movie_id": 1,
+                "title": "Alien",
+                "poster_url": "https://image.tmdb.org/t/p/w500/1.jpg",
+            }
+        ]
+    )
+
+    response = client.get("/api/movies/trending", params={"fields": "title,count"})
+
+    assert response.status_code == 200
+    assert response.json()["movies"] == [{"count": 10, "title": "Alien"}]
+
+
+def test_get_movies_pages_and_prefetches_next_page(monkeypatch):
+    monkeypatch.setattr(main, "MOVIES_PREFETCH_ENABLED", True)
+    pages = {
+        page: {
+            "page": page,
+            "total_pages": 2,
+            "total_results": 2,
+            "results": [tmdb_movie(page)],
+        }
+        for page in (1, 2)
+    }
+
+    async def get(url):
+        page = int(url.rsplit("page=", 1)[1])
+        response = MagicMock()
+        response.content = json.dumps(pages[page]).encode()
+        return response
+
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.side_effect = get
+    use_tmdb_client(mock_async_client_instance)
+
+    with TestClient(app) as lifespan_client:
+        first = lifespan_client.get("/api/movies", params={"search_term": "heat"})
+        # Let the background prefetch finish on the app's loop
+        lifespan_client.portal.call(main.movies_prefetcher.wait)
+        calls_after_first = mock_async_client_instance.get.call_count
+        second = lifespan_client.get(
+            "/api/movies", params={"search_term": "heat", "page": 2}
+        )
+
+    assert first.json()["page"] == 1
+    assert first.json()["total_pages"] == 2
+    assert second.json()["results"][0]["id"] == 2
+    # Page 2 came from the prefetch and the last page prefetches nothing
+    assert calls_after_first == 2
+    assert mock_async_client_instance.get.call_count == 2
+    assert client.get("/api/movies", params={"page": 501}).status_code == 422
+
+
+def test_suggest_answers_from_titles_already_seen():
+    mock_response = MagicMock()
+    movie = {**tmdb_movie(1), "title": "Heat", "popularity": 40.0}
+    mock_response.content = json.dumps(
+        {"page": 1, "results": [movie, tmdb_movie(2)]}
+    ).encode()
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.return_value = mock_response
+    use_tmdb_client(mock_async_client_instance)
+
+    client.get("/api/movies")
+    response = client.get("/api/movies/suggest", params={"q": "hea"})
+    ranked = client.get("/api/movies/suggest", params={"q": "m", "limit": 1})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "query": "hea",
+        "results": [
+            {
+                "id": 1,
+                "title": "Heat",
+                "popularity": 40.0,
+                "poster_path": "/poster1.jpg",
+            }
+        ],
+    }
+    assert ranked.json()["results"][0]["id"] == 2
+    assert client.get("/api/movies/suggest").status_code == 422
+    mock_async_client_instance.get.assert_called_once()
+
+
+def test_get_movies_reads_through_the_disk_cache(monkeypatch, tmp_path):
+    from utils.disk_cache import DiskCache
+
+    monkeypatch.setattr(
+        main, "movies_disk_cache", DiskCache(str(tmp_path / "tmdb.sqlite3"))
+    )
+    mock_response = MagicMock()
+    mock_response.content = json.dumps({"page": 1, "results": [tmdb_movie(1)]}).encode()
+    mock_async_client_instance = AsyncMock()
+    mock_async_client_instance.get.return_value = mock_response
+    use_tmdb_client(mock_async_client_instance)
+
+    async def background_writes():
+        await asyncio.gather(*main.background_tasks)
+
+    with TestClient(app) as lifespan_client:
+        first = lifespan_client.get("/api/movies", params={"fields": "all"})
+        lifespan_client.portal.call(background_writes)
+        # A cold worker has nothing in memory
+        movies_cache.clear()
+        suggest_index.clear()
+        second = lifespan_client.get("/api/movies", params={"fields": "all"})
+        status = lifespan_client.get("/api/cache/status").json()["movies_disk"]
+
+    assert second.json() == first.json()
+    assert suggest_index.suggest("movie")[0]["id"] == 1
+    assert status["writes"] == 1
+    assert status["hits"] == 1
+    mock_async_client_instance.get.assert_called_once()
@@ -0,0 +1,76 @@
+import sys
+import os
+import asyncio
+import time
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.metrics import (
+    LoopLagMonitor,
+    MetricsRegistry,
+    UPSTREAM_ERRORS,
+    UPSTREAM_LATENCY,
+    UpstreamTimer,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram(
+        "latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0)
+    )
+    for value in [0.05, 0.5, 0.5, 3]:
+        histogram.observe(value, "/api/movies")
+
+    lines = registry.render().splitlines()
+
+    assert lines[:2] == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+    ]
+    assert 'latency_seconds_bucket{route="/api/movies",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/api/movies",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{route="/api/movies",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/api/movies"} 4.05' in lines
+    assert 'latency_seconds_count{route="/api/movies"} 4' in lines
+
+
+def test_counter_and_callback_render_with_escaped_labels():
+    registry = MetricsRegistry()
+    registry.counter("errors_total", "Errors", ("term",)).inc('say "hi"')
+    registry.callback("depth", "Queue depth", lambda: 7)
+
+    body = registry.render()
+
+    assert 'errors_total{term="say \\"hi\\""} 1' in body
+    assert "# TYPE depth gauge\ndepth 7" in body
+
+
+def test_upstream_timer_counts_errors():
+    errors_before = UPSTREAM_ERRORS.value("test", "boom")
+
+    with pytest.raises(RuntimeError):
+        with UpstreamTimer("test", "boom"):
+            raise RuntimeError("boom")
+    with UpstreamTimer("test", "ok"):
+        pass
+
+    assert UPSTREAM_ERRORS.value("test", "boom") == errors_before + 1
+    assert UPSTREAM_ERRORS.value("test", "ok") == 0
+    assert UPSTREAM_LATENCY.count("test", "ok") >= 1
+
+
+def test_loop_lag_monitor_sees_blocking_work():
+    async def run():
+        monitor = LoopLagMonitor(interval=0.01, registry=MetricsRegistry())
+        monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.05)  # Block the loop
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(run())
+
+    assert monitor.max_lag >= 0.03
@@ -0,0 +1,60 @@
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.prefetch import Prefetcher
+
+
+def test_prefetcher_respects_budget_and_dedupes():
+    async def run():
+        prefetcher = Prefetcher(max_inflight=2, rate=0, burst=3)
+        release = asyncio.Event()
+        done = []
+
+        async def fetch(key):
+            await release.wait()
+            done.append(key)
+
+        scheduled = [
+            prefetcher.schedule("a", lambda: fetch("a")),
+            prefetcher.schedule("a", lambda: fetch("a")),  # Already running
+            prefetcher.schedule("b", lambda: fetch("b")),
+            prefetcher.schedule("c", lambda: fetch("c")),  # Too many in flight
+        ]
+        release.set()
+        await prefetcher.wait()
+        # One token left, then the bucket is empty and never refills
+        scheduled += [
+            prefetcher.schedule("d", lambda: fetch("d")),
+            prefetcher.schedule("e", lambda: fetch("e")),
+        ]
+        await prefetcher.wait()
+        return scheduled, sorted(done), prefetcher.stats()
+
+    scheduled, done, stats = asyncio.run(run())
+
+    assert scheduled == [True, False, True, False, True, False]
+    assert done == ["a", "b", "d"]
+    assert stats == {
+        "inflight": 0,
+        "started": 3,
+        "completed": 3,
+        "failed": 0,
+        "skipped": 2,
+    }
+
+
+def test_prefetcher_counts_failures():
+    async def run():
+        prefetcher = Prefetcher()
+
+        async def fail():
+            raise RuntimeError("TMDB down")
+
+        prefetcher.schedule("a", fail)
+        await prefetcher.wait()
+        return prefetcher.stats()
+
+    assert asyncio.run(run())["failed"] == 1
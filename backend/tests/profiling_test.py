@@ -0,0 +1,67 @@
+import sys
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.profiling import ProfilingMiddleware
+
+
+def profiled_client(tmp_path, **options) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/api/movies")
+    async def movies():
+        return {"results": [sum(range(1000))]}
+
+    app.add_middleware(ProfilingMiddleware, directory=str(tmp_path), **options)
+    return TestClient(app)
+
+
+def test_requests_without_header_are_not_profiled(tmp_path):
+    client = profiled_client(tmp_path)
+
+    response = client.get("/api/movies")
+
+    assert response.json() == {"results": [499500]}
+    assert "x-profile-file" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_inline_profile_replaces_response(tmp_path):
+    client = profiled_client(tmp_path)
+
+    response = client.get("/api/movies", headers={"X-Profile": "inline"})
+
+    assert response.status_code == 200
+    assert response.text.startswith("GET /api/movies -> 200 in ")
+    assert "cumulative" in response.text
+
+
+def test_file_profiles_rotate(tmp_path):
+    client = profiled_client(tmp_path, keep=2)
+
+    names = [
+        client.get("/api/movies", headers={"X-Profile": "file"}).headers[
+            "x-profile-file"
+        ]
+        for _ in range(3)
+    ]
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == names[1:]
+
+
+def test_profiling_is_rate_limited_and_token_gated(tmp_path):
+    client = profiled_client(tmp_path, token="secret", max_per_minute=1)
+    headers = {"X-Profile": "file", "X-Profile-Token": "secret"}
+
+    without_token = client.get("/api/movies", headers={"X-Profile": "file"})
+    first = client.get("/api/movies", headers=headers)
+    second = client.get("/api/movies", headers=headers)
+
+    assert "x-profile-file" not in without_token.headers
+    assert "x-profile-file" in first.headers
+    assert second.headers["x-profile-skipped"] == "rate-limited"
+    assert second.json() == {"results": [499500]}
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,136 @@
+import sys
+import os
+import asyncio
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.pubsub import (
+    InProcessBroker,
+    RedisBroker,
+    create_broker,
+    encode_command,
+    read_reply,
+)
+from websocket_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent: list[str] = []
+
+    async def accept(self, subprotocol: str | None = None):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(text)
+
+    async def close(self):
+        pass
+
+
+def received(websocket: FakeWebSocket) -> list[str]:
+    return [json.loads(text)["type"] for text in websocket.sent]
+
+
+async def start_fake_redis():
+    """Just enough of the Redis protocol for SUBSCRIBE and PUBLISH"""
+    subscribers: dict[str, list[asyncio.StreamWriter]] = {}
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                command = [part.decode() for part in await read_reply(reader)]
+                if command[0] == "SUBSCRIBE":
+                    subscribers.setdefault(command[1], []).append(writer)
+                    writer.write(
+                        b"*3\r\n$9\r\nsubscribe\r\n"
+                        + f"${len(command[1])}\r\n{command[1]}\r\n:1\r\n".encode()
+                    )
+                elif command[0] == "PUBLISH":
+                    targets = subscribers.get(command[1], [])
+                    for target in targets:
+                        target.write(
+                            b"*3\r\n$7\r\nmessage\r\n"
+                            + encode_command(command[1], command[2])[4:]
+                        )
+                    writer.write(f":{len(targets)}\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+async def connect_workers(broker_a, broker_b):
+    worker_a, worker_b = ConnectionManager(), ConnectionManager()
+    await worker_a.start_broker(broker_a)
+    await worker_b.start_broker(broker_b)
+    sockets = {name: FakeWebSocket() for name in ["sender", "local", "remote"]}
+    await worker_a.connect(sockets["sender"], "sender")
+    await worker_a.connect(sockets["local"], "local")
+    await worker_b.connect(sockets["remote"], "remote")
+    return worker_a, worker_b, sockets
+
+
+def test_in_process_broker_fans_out_without_duplicates():
+    async def run():
+        broker = InProcessBroker()
+        worker_a, worker_b, sockets = await connect_workers(broker, broker)
+        await worker_a.broadcast_to_all_other({"type": "new_favorite"}, "sender")
+        await asyncio.sleep(0.01)
+        return sockets
+
+    sockets = asyncio.run(run())
+
+    assert received(sockets["sender"]) == ["connection_established"]
+    assert received(sockets["local"]) == ["connection_established", "new_favorite"]
+    assert received(sockets["remote"]) == ["connection_established", "new_favorite"]
+
+
+def test_single_worker_delivers_locally_without_a_broker():
+    async def run():
+        worker = ConnectionManager()
+        broker = create_broker("memory")
+        sockets = {name: FakeWebSocket() for name in ["sender", "local"]}
+        await worker.connect(sockets["sender"], "sender")
+        await worker.connect(sockets["local"], "local")
+        await worker.broadcast_to_all_other({"type": "new_favorite"}, "sender")
+        await asyncio.sleep(0.01)
+        return broker, sockets
+
+    broker, sockets = asyncio.run(run())
+
+    # Nothing to fan out to, so messages are never wrapped for a broker
+    assert broker is None
+    assert received(sockets["local"]) == ["connection_established", "new_favorite"]
+
+
+def test_redis_broker_fans_out_across_workers():
+    async def run():
+        server = await start_fake_redis()
+        port = server.sockets[0].getsockname()[1]
+        broker_a = RedisBroker(f"redis://127.0.0.1:{port}/0")
+        broker_b = RedisBroker(f"redis://127.0.0.1:{port}/0")
+        worker_a, worker_b, sockets = await connect_workers(broker_a, broker_b)
+        await broker_a.wait_subscribed()
+        await broker_b.wait_subscribed()
+
+        await worker_a.broadcast_to_all_other({"type": "new_favorite"}, "sender")
+        await worker_b.send_personal_message({"type": "favorite_confirmed"}, "local")
+        await asyncio.sleep(0.05)
+
+        await worker_a.stop_broker()
+        await worker_b.stop_broker()
+        server.close()
+        return sockets
+
+    sockets = asyncio.run(run())
+
+    assert received(sockets["sender"]) == ["connection_established"]
+    assert received(sockets["local"]) == [
+        "connection_established",
+        "new_favorite",
+        "favorite_confirmed",
+    ]
+    assert received(sockets["remote"]) == ["connection_established", "new_favorite"]
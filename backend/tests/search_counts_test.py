@@ -0,0 +1,132 @@
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.search_counts import PartialFlushError, SearchCountAggregator
+
+
+def test_increments_are_coalesced_per_term():
+    batches = []
+
+    async def flush_fn(batch):
+        batches.append(batch)
+
+    aggregator = SearchCountAggregator(flush_fn)
+    movie = {"id": 1, "title": "Alien"}
+    for _ in range(3):
+        aggregator.record("alien", movie)
+    aggregator.record("heat", {"id": 2, "title": "Heat"})
+
+    asyncio.run(aggregator.flush())
+
+    assert batches == [{"alien": (3, movie), "heat": (1, {"id": 2, "title": "Heat"})}]
+    assert aggregator.stats()["pending_terms"] == 0
+    assert aggregator.stats()["flushed_increments"] == 4
+
+
+def test_failed_flush_is_requeued():
+    async def flush_fn(batch):
+        raise RuntimeError("appwrite down")
+
+    aggregator = SearchCountAggregator(flush_fn)
+    aggregator.record("alien", {"id": 1})
+    asyncio.run(aggregator.flush())
+    aggregator.record("alien", {"id": 1})
+
+    stats = aggregator.stats()
+    assert stats["flush_failures"] == 1
+    assert stats["pending_increments"] == 2
+
+
+def test_partially_written_batch_requeues_only_unwritten_terms():
+    written = {}
+    failures = [RuntimeError("appwrite down")]
+
+    async def flush_fn(batch):
+        done = set()
+        for term, (count, _) in batch.items():
+            if term == "bad" and failures:
+                raise PartialFlushError(done, failures.pop())
+            written[term] = written.get(term, 0) + count
+            done.add(term)
+
+    aggregator = SearchCountAggregator(flush_fn)
+    aggregator.record("good", {"id": 1})
+    aggregator.record("bad", {"id": 2})
+    asyncio.run(aggregator.flush())
+    asyncio.run(aggregator.flush())
+
+    assert written == {"good": 1, "bad": 1}
+    stats = aggregator.stats()
+    assert stats["flush_failures"] == 1
+    assert stats["flushed_increments"] == 2
+    assert stats["pending_terms"] == 0
+
+
+def test_flush_writes_at_most_batch_size_terms_per_call():
+    batches = []
+
+    async def flush_fn(batch):
+        batches.append(len(batch))
+
+    aggregator = SearchCountAggregator(flush_fn, batch_size=100)
+    for i in range(250):
+        aggregator.record(f"term {i}", {"id": i})
+    asyncio.run(aggregator.flush())
+
+    assert batches == [100, 100, 50]
+    assert aggregator.stats()["pending_terms"] == 0
+    assert aggregator.stats()["flushed_increments"] == 250
+
+
+def test_flush_stops_at_the_first_failed_batch():
+    calls = []
+
+    async def flush_fn(batch):
+        calls.append(len(batch))
+        raise RuntimeError("appwrite down")
+
+    aggregator = SearchCountAggregator(flush_fn, batch_size=2)
+    for term in ["a", "b", "c", "d", "e"]:
+        aggregator.record(term, {"id": 1})
+    asyncio.run(aggregator.flush())
+
+    assert calls == [2]
+    assert aggregator.stats()["pending_terms"] == 5
+
+
+def test_pending_terms_are_bounded():
+    async def flush_fn(batch):
+        pass
+
+    aggregator = SearchCountAggregator(flush_fn, max_pending=2)
+    for term in ["a", "b", "c"]:
+        aggregator.record(term, {"id": 1})
+    aggregator.record("a", {"id": 1})
+
+    stats = aggregator.stats()
+    assert stats["pending_terms"] == 2
+    assert stats["pending_increments"] == 3
+    assert stats["dropped_increments"] == 1
+
+
+def test_batch_size_triggers_flush_and_stop_drains():
+    batches = []
+
+    async def flush_fn(batch):
+        batches.append(batch)
+
+    async def run():
+        aggregator = SearchCountAggregator(flush_fn, flush_interval=60, batch_size=2)
+        aggregator.start()
+        aggregator.record("a", {"id": 1})
+        aggregator.record("b", {"id": 2})
+        await asyncio.sleep(0.01)
+        aggregator.record("c", {"id": 3})
+        await aggregator.stop()
+
+    asyncio.run(run())
+
+    assert [set(batch) for batch in batches] == [{"a", "b"}, {"c"}]
@@ -0,0 +1,59 @@
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"results": []}
+
+    async def run():
+        return await asyncio.gather(*(flight.do("url", fetch) for _ in range(10)))
+
+    results = asyncio.run(run())
+
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "shared": 9}
+
+
+def test_concurrent_calls_share_one_error():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def run():
+        return await asyncio.gather(
+            *(flight.do("url", fetch) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.calls == 1
+
+
+def test_sequential_calls_are_not_coalesced():
+    flight = SingleFlight()
+
+    async def fetch():
+        return 1
+
+    async def run():
+        await flight.do("url", fetch)
+        await flight.do("url", fetch)
+
+    asyncio.run(run())
+    assert flight.calls == 2
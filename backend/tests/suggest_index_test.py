@@ -0,0 +1,101 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.suggest_index import SuggestIndex, normalize
+
+
+def test_normalize_folds_case_accents_and_punctuation():
+    assert normalize("  Amélie: Le Fabuleux-Destin ") == "amelie le fabuleux destin"
+
+
+def test_suggest_matches_word_prefixes_ranked_by_popularity():
+    index = SuggestIndex()
+    index.add_movies(
+        [
+            {"id": 1, "title": "The Dark Knight", "popularity": 80.0},
+            {"id": 2, "title": "Dark City", "popularity": 20.0},
+            {
+                "id": 3,
+                "title": "Darkest Hour",
+                "popularity": 50.0,
+                "poster_path": "/3.jpg",
+            },
+            {"id": 4, "title": "Heat", "popularity": 99.0},
+        ]
+    )
+
+    assert [m["id"] for m in index.suggest("dark")] == [1, 3, 2]
+    assert [m["id"] for m in index.suggest("DARK k")] == [1]
+    assert index.suggest("darke")[0] == {
+        "id": 3,
+        "title": "Darkest Hour",
+        "popularity": 50.0,
+        "poster_path": "/3.jpg",
+    }
+    assert [m["id"] for m in index.suggest("dark", limit=2)] == [1, 3]
+    assert index.suggest("  ") == []
+
+
+def test_short_prefixes_rank_every_match():
+    index = SuggestIndex()
+    for movie_id in range(600):
+        index.add(movie_id, f"Aa movie {movie_id}", 1.0)
+    index.add(1000, "Avatar", 500.0)
+
+    assert index.suggest("a", limit=1)[0]["title"] == "Avatar"
+    assert len(index.suggest("aa", limit=1000)) == 600
+
+
+def test_short_prefix_ranking_follows_popularity_changes():
+    index = SuggestIndex()
+    for movie_id in range(300):
+        index.add(movie_id, f"Star {movie_id}", float(movie_id))
+
+    # The top titles drop out of the kept list, the rest must be re-ranked
+    for movie_id in range(299, 199, -1):
+        index.add(movie_id, f"Star {movie_id}", 0.0)
+    index.add(5, "Moon 5")
+
+    assert [m["id"] for m in index.suggest("s", limit=3)] == [199, 198, 197]
+    assert [m["id"] for m in index.suggest("m")] == [5]
+
+
+def test_readding_keeps_popularity_and_replaces_renamed_titles():
+    index = SuggestIndex()
+    index.add(1, "Alien", 30.0, "/1.jpg")
+    # Trending entries don't know popularity or the poster path
+    index.add(1, "Alien")
+    index.add(2, "Old Name", 5.0)
+    index.add(2, "New Name")
+
+    assert index.suggest("alien") == [
+        {"id": 1, "title": "Alien", "popularity": 30.0, "poster_path": "/1.jpg"}
+    ]
+    assert index.suggest("old") == []
+    assert index.suggest("new")[0]["popularity"] == 5.0
+    assert index.stats()["keys"] == 3
+
+
+def test_index_is_bounded_by_popularity():
+    index = SuggestIndex(maxsize=10)
+    for movie_id in range(12):
+        index.add(movie_id, f"Movie {movie_id}", float(movie_id))
+
+    assert len(index) == 10
+    assert index.stats()["evictions"] == 2
+    assert {m["id"] for m in index.suggest("movie", limit=20)} == set(range(2, 12))
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "snapshots" / "suggest.json")
+    index = SuggestIndex()
+    index.add(1, "Alien", 30.0, "/1.jpg")
+    index.add(2, "Aliens", 40.0)
+    index.save(path)
+
+    restored = SuggestIndex()
+    assert restored.load(path) == 2
+    assert restored.suggest("ali") == index.suggest("ali")
+    assert os.listdir(tmp_path / "snapshots") == ["suggest.json"]
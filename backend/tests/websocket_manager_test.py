@@ -0,0 +1,267 @@
+import sys
+import os
+import asyncio
+import json
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from websocket_manager import ConnectionManager, DISCONNECT, DROP_OLDEST
+from utils.ws_codec import Codec
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.sent: list[str | bytes] = []
+        self.closed = False
+        self.subprotocol = None
+
+    async def accept(self, subprotocol: str | None = None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def send_bytes(self, data: bytes):
+        await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+    async def close(self):
+        self.closed = True
+
+
+def messages(websocket: FakeWebSocket) -> list[dict]:
+    return [json.loads(text) for text in websocket.sent]
+
+
+def test_broadcast_serializes_once_and_skips_sender():
+    async def run():
+        manager = ConnectionManager()
+        sockets = {user_id: FakeWebSocket() for user_id in ["a", "b", "c"]}
+        for user_id, websocket in sockets.items():
+            await manager.connect(websocket, user_id)
+
+        with patch("websocket_manager.json.dumps", wraps=json.dumps) as mock_dumps:
+            sent = await manager.broadcast_to_all_other({"type": "new_favorite"}, "a")
+        await asyncio.sleep(0.01)
+        return sent, mock_dumps.call_count, sockets
+
+    sent, dumps_calls, sockets = asyncio.run(run())
+
+    assert sent == 2
+    assert dumps_calls == 1
+    assert messages(sockets["a"])[-1]["type"] == "connection_established"
+    assert messages(sockets["b"])[-1] == {"type": "new_favorite"}
+    assert messages(sockets["c"])[-1] == {"type": "new_favorite"}
+
+
+def test_slow_consumer_does_not_delay_others():
+    async def run():
+        manager = ConnectionManager()
+        slow, fast = FakeWebSocket(delay=1), FakeWebSocket()
+        await manager.connect(slow, "slow")
+        await manager.connect(fast, "fast")
+
+        await manager.broadcast_to_all_other({"type": "new_favorite"}, "sender")
+        await asyncio.sleep(0.05)
+        return slow, fast
+
+    slow, fast = asyncio.run(run())
+
+    assert messages(fast)[-1] == {"type": "new_favorite"}
+    assert slow.sent == []
+
+
+def test_full_queue_drops_oldest_message():
+    async def run():
+        manager = ConnectionManager(send_queue_size=2, slow_consumer_policy=DROP_OLDEST)
+        websocket = FakeWebSocket(delay=1)
+        connection = await manager.connect(websocket, "user")
+        # The writer is now stuck sending the connection_established message
+        await asyncio.sleep(0.01)
+        for i in range(3):
+            await manager.send_personal_message({"n": i}, "user")
+        queued = [json.loads(connection.queue.get_nowait()) for _ in range(2)]
+        return manager, queued
+
+    manager, queued = asyncio.run(run())
+
+    assert queued == [{"n": 1}, {"n": 2}]
+    assert manager.stats()["dropped_messages"] == 1
+
+
+def test_full_queue_evicts_with_disconnect_policy():
+    async def run():
+        manager = ConnectionManager(send_queue_size=1, slow_consumer_policy=DISCONNECT)
+        websocket = FakeWebSocket(delay=1)
+        await manager.connect(websocket, "user")
+        await manager.send_personal_message({"n": 1}, "user")
+        await asyncio.sleep(0.01)
+        return manager, websocket
+
+    manager, websocket = asyncio.run(run())
+
+    assert "user" not in manager.connections
+    assert websocket.closed
+    assert manager.stats()["evicted_connections"] == 1
+
+
+def test_multiple_connections_per_user():
+    async def run():
+        manager = ConnectionManager(shard_count=4)
+        first_tab, second_tab, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        first = await manager.connect(first_tab, "user")
+        await manager.connect(second_tab, "user")
+        await manager.connect(other, "other")
+        stats_connected = manager.stats()
+
+        await manager.broadcast_to_all_other({"type": "new_favorite"}, "other")
+        await asyncio.sleep(0.01)
+        await manager.disconnect("user", first)
+        await manager.send_personal_message({"type": "hello"}, "user")
+        await asyncio.sleep(0.01)
+        return manager, stats_connected, first_tab, second_tab
+
+    manager, stats_connected, first_tab, second_tab = asyncio.run(run())
+
+    assert stats_connected["active_connections"] == 3
+    assert stats_connected["connected_users"] == 2
+    assert messages(first_tab)[-1] == {"type": "new_favorite"}
+    assert first_tab.closed
+    assert messages(second_tab)[-2:] == [{"type": "new_favorite"}, {"type": "hello"}]
+    assert manager.stats()["active_connections"] == 2
+    assert manager.stats()["connected_users"] == 2
+
+
+def test_digest_batches_favorites_per_window():
+    async def run():
+        manager = ConnectionManager()
+        manager.configure(100, DROP_OLDEST, digest_window=0.05)
+        sockets = {user_id: FakeWebSocket() for user_id in ["a", "b", "c"]}
+        for user_id, websocket in sockets.items():
+            await manager.connect(websocket, user_id)
+
+        await manager.handle_favorite_action("a", {"title": "Alien"}, "Ann")
+        await manager.handle_favorite_action("b", {"title": "Heat"}, "Ben")
+        await asyncio.sleep(0.01)
+        before_flush = {user_id: messages(ws)[-1] for user_id, ws in sockets.items()}
+        await asyncio.sleep(0.1)
+        return manager, before_flush, sockets
+
+    manager, before_flush, sockets = asyncio.run(run())
+
+    assert before_flush["a"]["type"] == "favorite_confirmed"
+    assert before_flush["c"]["type"] == "connection_established"
+    # Authors only hear about the other favorites
+    assert messages(sockets["a"])[-1] == {
+        "type": "new_favorite",
+        "message": "🎬 Ben just favorited Heat",
+    }
+    assert messages(sockets["b"])[-1]["message"] == "🎬 Ann just favorited Alien"
+    digest = messages(sockets["c"])[-1]
+    assert digest["type"] == "favorite_digest"
+    assert digest["count"] == 2
+    assert [f["title"] for f in digest["favorites"]] == ["Alien", "Heat"]
+    assert sum(m["type"] == "favorite_digest" for m in messages(sockets["c"])) == 1
+    assert manager.stats()["digests_sent"] == 1
+
+
+def test_digest_flushes_at_cap_and_on_demand():
+    async def run():
+        manager = ConnectionManager()
+        manager.configure(100, DROP_OLDEST, digest_window=60, digest_max_events=2)
+        watcher = FakeWebSocket()
+        await manager.connect(watcher, "watcher")
+
+        for title in ["A", "B", "C"]:
+            await manager.handle_favorite_action("a", {"title": title}, "Ann")
+        await asyncio.sleep(0.01)
+        at_cap = messages(watcher)[-1]
+        pending = manager.stats()["pending_digest_events"]
+        await manager.flush_digest()
+        await asyncio.sleep(0.01)
+        return at_cap, pending, messages(watcher)[-1], manager
+
+    at_cap, pending, flushed, manager = asyncio.run(run())
+
+    assert at_cap["count"] == 2
+    assert pending == 1
+    assert flushed["message"] == "🎬 Ann just favorited C"
+    assert manager.stats()["pending_digest_events"] == 0
+
+
+def test_heartbeat_pings_quiet_and_reaps_idle_connections():
+    async def run():
+        manager = ConnectionManager()
+        manager.configure(
+            100, DROP_OLDEST, heartbeat_interval=10, idle_timeout=30, reap_batch_size=2
+        )
+        fresh, quiet = FakeWebSocket(), FakeWebSocket()
+        idle = [FakeWebSocket() for _ in range(3)]
+        await manager.connect(fresh, "fresh")
+        quiet_connection = await manager.connect(quiet, "quiet")
+        idle_connections = [
+            await manager.connect(websocket, f"idle-{i}")
+            for i, websocket in enumerate(idle)
+        ]
+        quiet_connection.last_seen -= 15
+        for connection in idle_connections:
+            connection.last_seen -= 60
+
+        reaped = await manager.heartbeat()
+        await asyncio.sleep(0.01)
+        return manager, reaped, fresh, quiet, idle
+
+    manager, reaped, fresh, quiet, idle = asyncio.run(run())
+
+    assert reaped == 3
+    assert all(websocket.closed for websocket in idle)
+    assert messages(quiet)[-1]["type"] == "ping"
+    assert messages(fresh)[-1]["type"] == "connection_established"
+    stats = manager.stats()
+    assert stats["active_connections"] == 2
+    assert stats["reaped_connections"] == 3
+    assert stats["heartbeats_sent"] == 1
+    assert stats["reap_runs"] == 1
+
+
+class BinaryJSONCodec(Codec):
+    name = "binary-json"
+    binary = True
+
+    def encode(self, message: dict) -> bytes:
+        return json.dumps(message).encode()
+
+
+def test_broadcast_encodes_once_per_encoding():
+    async def run():
+        manager = ConnectionManager()
+        codec = BinaryJSONCodec("movies.v1.binary-json")
+        text_sockets = [FakeWebSocket(), FakeWebSocket()]
+        binary_sockets = [FakeWebSocket(), FakeWebSocket()]
+        await manager.connect(FakeWebSocket(), "sender")
+        for i, websocket in enumerate(text_sockets):
+            await manager.connect(websocket, f"text-{i}")
+        for i, websocket in enumerate(binary_sockets):
+            await manager.connect(websocket, f"binary-{i}", codec)
+
+        with patch.object(codec, "encode", wraps=codec.encode) as mock_encode:
+            sent = await manager.broadcast_to_all_other(
+                {"type": "new_favorite"}, "sender"
+            )
+        await asyncio.sleep(0.01)
+        return sent, mock_encode.call_count, text_sockets, binary_sockets
+
+    sent, encode_calls, text_sockets, binary_sockets = asyncio.run(run())
+
+    assert sent == 4
+    assert encode_calls == 1
+    for websocket in binary_sockets:
+        assert websocket.subprotocol == "movies.v1.binary-json"
+        assert json.loads(websocket.sent[0])["encoding"] == "binary-json"
+        assert websocket.sent[-1] == b'{"type": "new_favorite"}'
+    for websocket in text_sockets:
+        assert websocket.subprotocol is None
+        assert messages(websocket)[-1] == {"type": "new_favorite"}
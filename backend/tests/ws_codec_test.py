@@ -0,0 +1,48 @@
+import sys
+import os
+import json
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import ws_codec
+from utils.ws_codec import JSON_CODEC, OutboundMessage, negotiate
+
+
+def test_negotiate_defaults_to_json():
+    assert negotiate([]) is JSON_CODEC
+    assert negotiate(["chat", "movies.v9.json"]) is JSON_CODEC
+
+    codec = negotiate(["movies.v1.json"])
+    assert codec.name == "json"
+    assert codec.subprotocol == "movies.v1.json"
+
+
+def test_negotiate_skips_msgpack_when_missing(monkeypatch):
+    monkeypatch.setattr(ws_codec, "msgpack", None)
+
+    codec = negotiate(["movies.v1.msgpack", "movies.v1.json"])
+
+    assert codec.name == "json"
+    assert codec.subprotocol == "movies.v1.json"
+    assert ws_codec.available_encodings() == ["json"]
+
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+
+    codec = negotiate(["movies.v1.msgpack", "movies.v1.json"])
+    frame = codec.encode({"type": "new_favorite", "count": 2})
+
+    assert codec.binary
+    assert msgpack.unpackb(frame) == {"type": "new_favorite", "count": 2}
+    assert codec.decode(frame) == {"type": "new_favorite", "count": 2}
+    assert codec.decode('{"type": "ping"}') == {"type": "ping"}
+
+
+def test_outbound_message_reuses_relayed_text():
+    text = json.dumps({"type": "new_favorite"})
+    outbound = OutboundMessage(text=text)
+
+    assert outbound.encode(JSON_CODEC) is text
+    assert outbound.message == {"type": "new_favorite"}
@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+FRESH = "fresh"
+STALE = "stale"
+
+
+class TTLCache:
+    """Size-bounded LRU cache with per-entry TTL and a stale-while-revalidate window.
+
+    Entries are fresh for ``ttl`` seconds, then served as stale for another
+    ``stale_ttl`` seconds while the caller refreshes them, and dropped after that.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, stale_ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # key -> (value, fresh_until, expires_at)
+        self._entries: OrderedDict[Hashable, tuple[Any, float, float]] = OrderedDict()
+        self._refreshing: set[Hashable] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> tuple[Any, str | None]:
+        """Return (value, FRESH | STALE) or (None, None) on a miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, None
+
+        value, fresh_until, expires_at = entry
+        now = time.monotonic()
+        if now <= fresh_until:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value, FRESH
+        if now <= expires_at:
+            self._entries.move_to_end(key)
+            self.stale_hits += 1
+            return value, STALE
+
+        del self._entries[key]
+        self.misses += 1
+        return None, None
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """Store a value, ``ttl`` overrides the cache wide TTL for this entry"""
+        fresh_until = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (value, fresh_until, fresh_until + self.stale_ttl)
+        self._entries.move_to_end(key)
+        self._refreshing.discard(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._refreshing.discard(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._refreshing.clear()
+
+    def begin_refresh(self, key: Hashable) -> bool:
+        """Claim the background refresh of a stale key, False if one is already running"""
+        if key in self._refreshing:
+            return False
+        self._refreshing.add(key)
+        return True
+
+    def end_refresh(self, key: Hashable):
+        self._refreshing.discard(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
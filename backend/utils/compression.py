@@ -0,0 +1,43 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt, gzip only if an install lacks it
+    brotli = None
+
+
+def supported_encodings() -> list[str]:
+    """In order of preference"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def choose_encoding(accept_encoding: str | None) -> str | None:
+    """Pick the best encoding the client accepts, honouring q=0"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    candidates = [
+        encoding
+        for encoding in supported_encodings()
+        if accepted.get(encoding, accepted.get("*", 0)) > 0
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda e: accepted.get(e, accepted.get("*", 0)))
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(body, compresslevel=6, mtime=0)
@@ -0,0 +1,197 @@
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from utils.logger import setup_colored_logging
+
+logger = setup_colored_logging()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+# Newest entries are kept, everything past ``max_bytes`` of bodies is dropped
+_DELETE_OVER_BUDGET = """
+DELETE FROM entries WHERE key IN (
+    SELECT key FROM (
+        SELECT key, SUM(size) OVER (ORDER BY stored_at DESC, key) AS total
+        FROM entries
+    ) WHERE total > ?
+)
+"""
+
+
+class DiskCache:
+    """Response bodies in a SQLite file, shared by every worker on the host.
+
+    The database runs in WAL mode so readers never wait for a writer, and
+    writers from other processes wait up to ``busy_timeout`` seconds for the
+    lock. Entries live for ``ttl`` seconds. Every ``compact_every`` writes the
+    expired entries are deleted and the oldest ones too while the bodies take
+    more than ``max_bytes``.
+
+    All SQLite work runs on one thread of its own. Errors are logged and
+    treated as a miss, the cache is never a reason for a request to fail.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+        compact_every: int = 100,
+        busy_timeout: float = 5.0,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compact_every = compact_every
+        self.busy_timeout = busy_timeout
+        self._connection: sqlite3.Connection | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._writes_since_compaction = 0
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compactions = 0
+        self.errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            # Must be set before the first table exists to take effect
+            connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.execute("PRAGMA journal_mode=WAL")
+            # WAL keeps the file consistent, a power cut may only lose recent writes
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _get(self, key: str) -> bytes | None:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT body FROM entries WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        return None if row is None else row[0]
+
+    def _set(self, key: str, body: bytes):
+        connection = self._connect()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front, so two workers can't deadlock
+        # trying to upgrade their read locks
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, body, len(body), now, now + self.ttl),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._writes_since_compaction += 1
+        if self._writes_since_compaction >= self.compact_every:
+            self._compact()
+
+    def _compact(self) -> int:
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            removed = connection.execute(
+                "DELETE FROM entries WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+            removed += connection.execute(
+                _DELETE_OVER_BUDGET, (self.max_bytes,)
+            ).rowcount
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        # Give the freed pages back to the filesystem
+        connection.execute("PRAGMA incremental_vacuum")
+        self._writes_since_compaction = 0
+        self.compactions += 1
+        return removed
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="disk-cache"
+            )
+        return self._executor
+
+    async def _call(self, fn, *args):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Disk cache is closed")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), partial(fn, *args))
+
+    async def get(self, key: str) -> bytes | None:
+        try:
+            body = await self._call(self._get, key)
+        except (sqlite3.Error, OSError) as e:
+            self.errors += 1
+            logger.warning(f"Disk cache read failed for {key}: {e}")
+            return None
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    async def set(self, key: str, body: bytes):
+        try:
+            await self._call(self._set, key, body)
+            self.writes += 1
+        except (sqlite3.Error, OSError) as e:
+            self.errors += 1
+            logger.warning(f"Disk cache write failed for {key}: {e}")
+
+    async def compact(self) -> int:
+        """Drop expired and over budget entries, returns how many were removed"""
+        try:
+            return await self._call(self._compact)
+        except (sqlite3.Error, OSError) as e:
+            self.errors += 1
+            logger.warning(f"Disk cache compaction failed: {e}")
+            return 0
+
+    def close(self):
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "compactions": self.compactions,
+            "errors": self.errors,
+        }
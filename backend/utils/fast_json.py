@@ -0,0 +1,46 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # in requirements.txt, stdlib json only if an install lacks it
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def loads(data: bytes | str):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Projections and compressed copies kept per document, more are built per request
+MAX_VARIANTS = 16
+
+
+class SerializedJSON:
+    """A validated document kept together with its encoded body.
+
+    Cached responses are encoded once, when they enter the cache, and every
+    hit sends the same bytes.
+    """
+
+    __slots__ = ("data", "body", "_variants")
+
+    def __init__(self, data, body: bytes | None = None):
+        self.data = data
+        self.body = dumps(data) if body is None else body
+        self._variants: dict = {}
+
+    def variant(self, key, build) -> bytes:
+        """Bytes derived from the document, e.g. a projection, built once per key"""
+        body = self._variants.get(key)
+        if body is None:
+            body = build()
+            if len(self._variants) < MAX_VARIANTS:
+                self._variants[key] = body
+        return body
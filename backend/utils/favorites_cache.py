@@ -0,0 +1,85 @@
+import hashlib
+import itertools
+import json
+from collections import OrderedDict
+from utils.cache import TTLCache
+
+
+def favorites_etag(favorites: list[dict]) -> str:
+    body = json.dumps(favorites, sort_keys=True, separators=(",", ":"))
+    return f'"{hashlib.sha256(body.encode()).hexdigest()[:32]}"'
+
+
+class FavoritesCache:
+    """Per-user favorites with a strong ETag, updated in place on writes.
+
+    Entries expire after ``ttl`` seconds so writes made by another worker are
+    picked up eventually.
+
+    A list loaded from Appwrite may predate a write that finished while it was
+    loading. Loads take a ``generation()`` first and pass it to ``set``, which
+    doesn't cache the list if the user has written since.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60):
+        self.maxsize = maxsize
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generations = itertools.count(1)
+        self._generation = 0
+        # user id -> generation of the user's last write, oldest first
+        self._written_at: OrderedDict[str, int] = OrderedDict()
+        # Users dropped from _written_at may have written up to this generation
+        self._forgotten_at = 0
+
+    def generation(self) -> int:
+        return self._generation
+
+    def _mark_written(self, user_id: str):
+        self._generation = next(self._generations)
+        self._written_at[user_id] = self._generation
+        self._written_at.move_to_end(user_id)
+        if len(self._written_at) > self.maxsize:
+            _, self._forgotten_at = self._written_at.popitem(last=False)
+
+    def get(self, user_id: str) -> tuple[list[dict], str] | None:
+        """Return (favorites, etag) or None on a miss"""
+        entry, _ = self._cache.get(user_id)
+        return entry
+
+    def set(
+        self, user_id: str, favorites: list[dict], generation: int | None = None
+    ) -> str:
+        """Cache the list, unless the user wrote after ``generation``"""
+        etag = favorites_etag(favorites)
+        written_at = self._written_at.get(user_id, self._forgotten_at)
+        if generation is None or written_at <= generation:
+            self._cache.set(user_id, (favorites, etag))
+        return etag
+
+    def add(self, user_id: str, favorite: dict):
+        """Write through a new favorite, only if the user's list is cached"""
+        self._mark_written(user_id)
+        entry = self.get(user_id)
+        if entry is None:
+            return
+        favorites = [f for f in entry[0] if f["id"] != favorite["id"]]
+        self.set(user_id, favorites + [favorite])
+
+    def remove(self, user_id: str, movie_id: int):
+        self._mark_written(user_id)
+        entry = self.get(user_id)
+        if entry is None:
+            return
+        self.set(user_id, [f for f in entry[0] if f["id"] != movie_id])
+
+    def invalidate(self, user_id: str):
+        self._mark_written(user_id)
+        self._cache.delete(user_id)
+
+    def clear(self):
+        self._cache.clear()
+        self._written_at.clear()
+        self._forgotten_at = self._generation
+
+    def stats(self) -> dict:
+        return self._cache.stats()
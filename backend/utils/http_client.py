@@ -0,0 +1,37 @@
+import importlib.util
+import httpx
+from utils.logger import setup_colored_logging
+
+logger = setup_colored_logging()
+
+
+def create_tmdb_client(
+    headers: dict,
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20,
+    keepalive_expiry: float = 30.0,
+    timeout: float = 10.0,
+    connect_timeout: float = 5.0,
+    http2: bool = False,
+) -> httpx.AsyncClient:
+    """Build the shared, pooled client used for every TMDB request"""
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning(
+            "TMDB_HTTP2 is enabled but the 'h2' package is missing, using HTTP/1.1"
+        )
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    timeouts = httpx.Timeout(timeout, connect=connect_timeout)
+
+    logger.info(
+        f"Creating TMDB client (max_connections={max_connections}, "
+        f"keepalive={max_keepalive_connections}, http2={http2})"
+    )
+    return httpx.AsyncClient(
+        headers=headers, limits=limits, timeout=timeouts, http2=http2
+    )
@@ -0,0 +1,64 @@
+import base64
+import hashlib
+import json
+import time
+from utils.cache import TTLCache
+
+# Stored for tokens Appwrite rejected, distinct from any user id
+INVALID = object()
+
+
+def jwt_expiry(token: str) -> float | None:
+    """Read the ``exp`` claim without verifying the token, Appwrite does the verification"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+class JWTCache:
+    """Bounded cache of JWT validation results keyed on a hash of the token.
+
+    Valid tokens are cached until their ``exp`` claim or ``max_ttl`` seconds,
+    whichever comes first. Rejected tokens are cached for ``negative_ttl``.
+    """
+
+    def __init__(
+        self, maxsize: int = 10000, max_ttl: float = 300, negative_ttl: float = 30
+    ):
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=max_ttl)
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str):
+        """Return the cached user id, INVALID for a rejected token or None on a miss"""
+        value, _ = self._cache.get(self._key(token))
+        return value
+
+    def set_valid(self, token: str, user_id: str):
+        ttl = self.max_ttl
+        exp = jwt_expiry(token)
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl > 0:
+            self._cache.set(self._key(token), user_id, ttl=ttl)
+
+    def set_invalid(self, token: str):
+        if self.negative_ttl > 0:
+            self._cache.set(self._key(token), INVALID, ttl=self.negative_ttl)
+
+    def evict(self, token: str):
+        self._cache.delete(self._key(token))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
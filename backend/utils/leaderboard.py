@@ -0,0 +1,58 @@
+import time
+import heapq
+
+
+class TrendingLeaderboard:
+    """In-memory top-K view of the search count collection.
+
+    Entries are kept per search term, updated with the counts written by the
+    search count flusher and replaced wholesale when reconciled with Appwrite.
+    Only the ``capacity`` highest counts are retained.
+    """
+
+    def __init__(self, capacity: int = 50):
+        self.capacity = capacity
+        self._entries: dict[str, dict] = {}
+        self._top: list[dict] | None = None
+        self.updated_at: float | None = None
+        self.reconciled_at: float | None = None
+
+    def update(self, entries: list[dict]):
+        """Merge entries with their absolute, already persisted counts"""
+        for entry in entries:
+            self._entries[entry["search_term"]] = entry
+        self._trim()
+        self._top = None
+        self.updated_at = time.time()
+
+    def replace(self, entries: list[dict]):
+        """Replace the leaderboard with an authoritative snapshot from Appwrite"""
+        self._entries = {entry["search_term"]: entry for entry in entries}
+        self._trim()
+        self._top = None
+        self.updated_at = self.reconciled_at = time.time()
+
+    def top(self, limit: int) -> list[dict]:
+        if self._top is None:
+            self._top = sorted(
+                self._entries.values(), key=lambda entry: entry["count"], reverse=True
+            )
+        return self._top[:limit]
+
+    def _trim(self):
+        if len(self._entries) > self.capacity:
+            keep = heapq.nlargest(
+                self.capacity, self._entries.values(), key=lambda entry: entry["count"]
+            )
+            self._entries = {entry["search_term"]: entry for entry in keep}
+
+    def clear(self):
+        self._entries = {}
+        self._top = None
+        self.updated_at = self.reconciled_at = None
+
+    def is_loaded(self) -> bool:
+        return self.reconciled_at is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
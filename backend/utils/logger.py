@@ -1,14 +1,25 @@
+import atexit
+import itertools
+import json
 import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
 from colorlog import ColoredFormatter
 
+# Pass as ``extra`` on high-volume per-message logs, only one in every
+# LOG_SAMPLE_RATE of them is emitted
+SAMPLED = {"sampled": True}
 
-def setup_colored_logging():
+_listener: logging.handlers.QueueListener | None = None
+_stream_handler: logging.StreamHandler | None = None
+_sampler: "SamplingFilter | None" = None
 
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.INFO)
 
+def colored_formatter() -> logging.Formatter:
     # Define the log format and colors
-    formatter = ColoredFormatter(
+    return ColoredFormatter(
         "%(log_color)s%(levelname)-8s%(reset)s %(message)s",
         datefmt=None,
         reset=True,
@@ -23,10 +34,96 @@ def setup_colored_logging():
         style="%",
     )
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(formatter)
 
-    if not logger.handlers:
-        logger.addHandler(handler)
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, for log collectors in production"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through every record except sampled ones, of which 1 in ``rate`` pass"""
+
+    def __init__(self, rate: int = 1):
+        super().__init__()
+        self.rate = max(rate, 1)
+        self._counter = itertools.count()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or self.rate == 1:
+            return True
+        if next(self._counter) % self.rate == 0:
+            return True
+        self.suppressed += 1
+        return False
+
+
+def configure_logging(
+    log_format: str | None = None,
+    level: str | None = None,
+    sample_rate: int | None = None,
+):
+    """Apply settings read after startup, e.g. from the .env file"""
+    logger = setup_colored_logging()
+    if log_format is not None:
+        _stream_handler.setFormatter(
+            JSONFormatter() if log_format == "json" else colored_formatter()
+        )
+    if level is not None:
+        logger.setLevel(level.upper())
+    if sample_rate is not None:
+        _sampler.rate = max(sample_rate, 1)
+
+
+def stop_logging():
+    """Flush queued records, registered to run at exit"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_colored_logging():
+    """Shared application logger.
+
+    Records are handed to a queue and written by a background thread, so the
+    event loop never blocks on log I/O. LOG_FORMAT=json switches from the
+    colored development output to structured JSON lines.
+    """
+    global _listener, _stream_handler, _sampler
+
+    logger = logging.getLogger(__name__)
+    if logger.handlers:
+        return logger
+
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _stream_handler = logging.StreamHandler()
+    _stream_handler.setFormatter(
+        JSONFormatter() if os.getenv("LOG_FORMAT") == "json" else colored_formatter()
+    )
+    log_queue: queue.Queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(
+        log_queue, _stream_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+
+    _sampler = SamplingFilter(int(os.getenv("LOG_SAMPLE_RATE", "100")))
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(_sampler)
+    logger.addHandler(queue_handler)
 
     return logger
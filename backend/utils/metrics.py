@@ -0,0 +1,285 @@
+import asyncio
+import bisect
+import time
+from typing import Callable
+from utils.logger import setup_colored_logging
+
+logger = setup_colored_logging()
+
+# Seconds, from a cache hit to a slow upstream call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+
+class CallbackMetric(Metric):
+    """A value read from existing stats when scraped, so the hot path pays nothing"""
+
+    def __init__(
+        self, name: str, help: str, callback: Callable[[], float], kind: str = "gauge"
+    ):
+        super().__init__(name, help)
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self) -> list[str]:
+        try:
+            return [f"{self.name} {_number(self.callback())}"]
+        except Exception as e:
+            logger.warning(f"Error collecting metric {self.name}: {e}")
+            return []
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last one is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> list[str]:
+        lines = []
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+                )
+            suffix = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_number(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # Re-registering replaces, so re-importing a module doesn't fail
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(
+        self, name: str, help: str, callback: Callable[[], float], kind: str = "gauge"
+    ):
+        return self.register(CallbackMetric(name, help, callback, kind))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+UPSTREAM_LATENCY = registry.histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to TMDB and Appwrite",
+    ("service", "operation"),
+)
+UPSTREAM_ERRORS = registry.counter(
+    "upstream_request_errors_total",
+    "Failed calls to TMDB and Appwrite",
+    ("service", "operation"),
+)
+
+
+class UpstreamTimer:
+    """Records one upstream call's latency, and an error if it raises"""
+
+    __slots__ = ("service", "operation", "start")
+
+    def __init__(self, service: str, operation: str):
+        self.service = service
+        self.operation = operation
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        UPSTREAM_LATENCY.observe(
+            time.perf_counter() - self.start, self.service, self.operation
+        )
+        if exc_type is not None:
+            UPSTREAM_ERRORS.inc(self.service, self.operation)
+        return False
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request, labelled by route template"""
+
+    def __init__(self, app, registry: MetricsRegistry = registry):
+        self.app = app
+        self.latency = registry.histogram(
+            "http_request_duration_seconds",
+            "HTTP request latency by route",
+            ("method", "route"),
+        )
+        self.requests = registry.counter(
+            "http_requests_total",
+            "HTTP requests by route and status",
+            ("method", "route", "status"),
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # FastAPI puts the matched route in the scope, raw paths would
+            # give every movie id its own series
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            self.latency.observe(time.perf_counter() - start, method, path)
+            self.requests.inc(method, path, str(status))
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task"""
+
+    def __init__(self, interval: float = 1.0, registry: MetricsRegistry = registry):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._task: asyncio.Task | None = None
+        self.histogram = registry.histogram(
+            "event_loop_lag_seconds",
+            "Delay between a scheduled wake-up and the loop running it",
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+        )
+        registry.callback(
+            "event_loop_lag_last_seconds",
+            "Most recent event loop lag",
+            lambda: self.last_lag,
+        )
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(time.perf_counter() - expected, 0.0))
+
+    def record(self, lag: float):
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.histogram.observe(lag)
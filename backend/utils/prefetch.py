@@ -0,0 +1,79 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Hashable
+from utils.logger import setup_colored_logging
+
+logger = setup_colored_logging()
+
+
+class Prefetcher:
+    """Runs speculative background fetches within a budget.
+
+    At most ``max_inflight`` prefetches run at once and they are started at no
+    more than ``rate`` per second on average, with bursts of up to ``burst``.
+    Anything over budget is skipped, never queued, so prefetching can't build
+    up a backlog of upstream calls when traffic spikes.
+    """
+
+    def __init__(self, max_inflight: int = 4, rate: float = 5, burst: int = 10):
+        self.max_inflight = max_inflight
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled_at) * self.rate
+        )
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def schedule(self, key: Hashable, fn: Callable[[], Awaitable[None]]) -> bool:
+        """Start ``fn`` in the background unless it's running or over budget"""
+        if key in self._inflight:
+            return False
+        if len(self._inflight) >= self.max_inflight or not self._take_token():
+            self.skipped += 1
+            return False
+        self.started += 1
+        task = asyncio.create_task(self._run(key, fn))
+        self._inflight[key] = task
+        return True
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[None]]):
+        try:
+            await fn()
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Prefetch of {key} failed: {e}")
+        finally:
+            self._inflight.pop(key, None)
+
+    async def wait(self):
+        """Wait for the running prefetches to finish"""
+        await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+
+    async def stop(self):
+        for task in self._inflight.values():
+            task.cancel()
+        await self.wait()
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,173 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+from collections import deque
+from datetime import datetime
+from utils.logger import setup_colored_logging
+
+logger = setup_colored_logging()
+
+PROFILE_HEADER = "x-profile"
+TOKEN_HEADER = "x-profile-token"
+
+
+class ProfilingMiddleware:
+    """Profile single requests that ask for it with an ``X-Profile`` header.
+
+    ``X-Profile: file`` writes a cProfile dump to ``directory``, keeping the
+    newest ``keep`` files, and names it in the ``X-Profile-File`` response
+    header. ``X-Profile: inline`` replaces the response with the top
+    functions by cumulative time. At most ``max_per_minute`` requests are
+    profiled, one at a time, and ``token`` must match ``X-Profile-Token`` when
+    set. Other requests are served normally.
+
+    cProfile sees everything the event loop runs while the request is in
+    flight, so profile on a quiet worker for a clean picture.
+    """
+
+    def __init__(
+        self,
+        app,
+        directory: str,
+        token: str | None = None,
+        max_per_minute: int = 6,
+        keep: int = 50,
+        inline_limit: int = 40,
+    ):
+        self.app = app
+        self.directory = directory
+        self.token = token
+        self.max_per_minute = max_per_minute
+        self.keep = keep
+        self.inline_limit = inline_limit
+        self._recent: deque[float] = deque()
+        self._active = False
+        self.profiled = 0
+        self.rejected = 0
+
+    def _admit(self) -> str | None:
+        """Reserve a profiling slot, or return why the request can't have one"""
+        if self._active:
+            return "busy"
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 60:
+            self._recent.popleft()
+        if len(self._recent) >= self.max_per_minute:
+            return "rate-limited"
+        self._recent.append(now)
+        self._active = True
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        mode = headers.get(PROFILE_HEADER.encode(), b"").decode().lower()
+        if mode not in ("file", "inline"):
+            await self.app(scope, receive, send)
+            return
+        if (
+            self.token
+            and headers.get(TOKEN_HEADER.encode(), b"").decode() != self.token
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        refused = self._admit()
+        if refused is not None:
+            self.rejected += 1
+
+            async def send_refused(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-profile-skipped", refused.encode())
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_refused)
+            return
+
+        try:
+            if mode == "inline":
+                await self._profile_inline(scope, receive, send)
+            else:
+                await self._profile_to_file(scope, receive, send)
+            self.profiled += 1
+        finally:
+            self._active = False
+
+    async def _profile_inline(self, scope, receive, send):
+        status = 500
+
+        async def capture(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+
+        output = io.StringIO()
+        output.write(
+            f"{scope['method']} {scope['path']} -> {status} in {elapsed * 1000:.1f}ms\n\n"
+        )
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.inline_limit)
+        body = output.getvalue().encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _profile_to_file(self, scope, receive, send):
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        filename = f"{stamp}-{scope['method']}-{slug}.prof"
+
+        async def send_with_name(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-file", filename.encode())
+                ]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_name)
+        finally:
+            profiler.disable()
+            await asyncio.to_thread(self._save, profiler, filename)
+
+    def _save(self, profiler: cProfile.Profile, filename: str):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.directory, filename))
+            profiles = sorted(
+                entry.path
+                for entry in os.scandir(self.directory)
+                if entry.name.endswith(".prof")
+            )
+            for old in profiles[: max(len(profiles) - self.keep, 0)]:
+                os.remove(old)
+            logger.info(f"Saved request profile {filename}")
+        except OSError as e:
+            logger.error(f"Error saving request profile {filename}: {e}")
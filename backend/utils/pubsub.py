@@ -0,0 +1,187 @@
+import asyncio
+import urllib.parse as urlparse
+from typing import Awaitable, Callable
+from utils.logger import setup_colored_logging
+
+logger = setup_colored_logging()
+
+MessageHandler = Callable[[str], Awaitable[None]]
+
+
+class Broker:
+    """Publish/subscribe transport used to fan messages out across workers"""
+
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        raise NotImplementedError
+
+    async def publish(self, channel: str, data: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InProcessBroker(Broker):
+    """Delivers to subscribers in the same process, e.g. several managers in tests"""
+
+    def __init__(self):
+        self._handlers: dict[str, list[MessageHandler]] = {}
+
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def publish(self, channel: str, data: str):
+        for handler in list(self._handlers.get(channel, [])):
+            try:
+                await handler(data)
+            except Exception as e:
+                logger.error(f"Error handling message on {channel}: {e}")
+
+    async def close(self):
+        self._handlers.clear()
+
+
+class RedisError(Exception):
+    pass
+
+
+def encode_command(*args: str | bytes) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by broker")
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b"+":
+        return payload.decode()
+    if prefix == b"-":
+        raise RedisError(payload.decode())
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length == -1:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        length = int(payload)
+        if length == -1:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply: {line!r}")
+
+
+class RedisBroker(Broker):
+    """Pub/sub over the Redis protocol (RESP) with plain asyncio streams.
+
+    Works with Redis, Valkey, KeyDB or any server speaking RESP2 PUBLISH and
+    SUBSCRIBE. The subscriber reconnects with backoff if the connection drops.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", max_backoff: float = 5.0):
+        parsed = urlparse.urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.max_backoff = max_backoff
+        self._publisher: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None = None
+        self._publish_lock: asyncio.Lock | None = None
+        self._listeners: list[asyncio.Task] = []
+        self._subscribed = asyncio.Event()
+
+    async def _open(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(encode_command("AUTH", self.password))
+            await writer.drain()
+            await read_reply(reader)
+        return reader, writer
+
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        self._listeners.append(asyncio.create_task(self._listen(channel, handler)))
+
+    async def wait_subscribed(self, timeout: float = 5.0):
+        await asyncio.wait_for(self._subscribed.wait(), timeout)
+
+    async def _listen(self, channel: str, handler: MessageHandler):
+        backoff = 0.1
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._open()
+                writer.write(encode_command("SUBSCRIBE", channel))
+                await writer.drain()
+                while True:
+                    reply = await read_reply(reader)
+                    if not isinstance(reply, list) or not reply:
+                        continue
+                    kind = (
+                        reply[0].decode() if isinstance(reply[0], bytes) else reply[0]
+                    )
+                    if kind == "subscribe":
+                        backoff = 0.1
+                        self._subscribed.set()
+                    elif kind == "message":
+                        try:
+                            await handler(reply[2].decode())
+                        except Exception as e:
+                            logger.error(f"Error handling message on {channel}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._subscribed.clear()
+                logger.warning(
+                    f"Broker subscription to {channel} lost: {e}, retrying in {backoff}s"
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+    async def publish(self, channel: str, data: str):
+        if self._publish_lock is None:
+            self._publish_lock = asyncio.Lock()
+        async with self._publish_lock:
+            # One retry on a fresh connection if the cached one went stale
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = await self._open()
+                    reader, writer = self._publisher
+                    writer.write(encode_command("PUBLISH", channel, data))
+                    await writer.drain()
+                    return await read_reply(reader)
+                except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                    self._close_publisher()
+                    if attempt == 1:
+                        raise
+
+    def _close_publisher(self):
+        if self._publisher is not None:
+            self._publisher[1].close()
+            self._publisher = None
+
+    async def close(self):
+        for listener in self._listeners:
+            listener.cancel()
+        await asyncio.gather(*self._listeners, return_exceptions=True)
+        self._listeners.clear()
+        self._close_publisher()
+
+
+def create_broker(kind: str, url: str | None = None) -> Broker | None:
+    """None for "memory": a single worker has nobody to fan out to, and
+    publishing would only encode every message to drop it as our own echo"""
+    if kind == "memory":
+        return None
+    if kind == "redis":
+        return RedisBroker(url or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown broker: {kind}")
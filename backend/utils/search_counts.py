@@ -0,0 +1,163 @@
+import asyncio
+import itertools
+import time
+from typing import Awaitable, Callable
+from utils.logger import setup_colored_logging
+
+logger = setup_colored_logging()
+
+# search_term -> (increment, first movie seen for the term)
+SearchCountBatch = dict[str, tuple[int, dict]]
+
+
+class PartialFlushError(Exception):
+    """Raised by a flush function that failed after writing some of the batch.
+
+    Only the terms not in ``written`` are queued again, so increments that
+    already reached the database are not applied twice.
+    """
+
+    def __init__(self, written: set[str], cause: Exception):
+        super().__init__(str(cause))
+        self.written = written
+
+
+class SearchCountAggregator:
+    """Write-behind aggregator for search counts.
+
+    Increments are coalesced per term in memory and written in one batch every
+    ``flush_interval`` seconds, or sooner once ``batch_size`` distinct terms are
+    pending. At most ``max_pending`` distinct terms are held, increments for new
+    terms beyond that are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[SearchCountBatch], Awaitable[None]],
+        flush_interval: float = 5.0,
+        batch_size: int = 100,
+        max_pending: int = 10000,
+    ):
+        self.flush_fn = flush_fn
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: SearchCountBatch = {}
+        self._flush_requested: asyncio.Event | None = None
+        self._stopping = False
+        self._task: asyncio.Task | None = None
+        self.flushes = 0
+        self.flush_failures = 0
+        self.flushed_increments = 0
+        self.dropped_increments = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def record(self, search_term: str, movie: dict):
+        pending = self._pending.get(search_term)
+        if pending is not None:
+            self._pending[search_term] = (pending[0] + 1, pending[1])
+        elif len(self._pending) >= self.max_pending:
+            self.dropped_increments += 1
+            self._request_flush()
+            return
+        else:
+            self._pending[search_term] = (1, movie)
+
+        if len(self._pending) >= self.batch_size:
+            self._request_flush()
+
+    def _request_flush(self):
+        if self._flush_requested is not None:
+            self._flush_requested.set()
+
+    def start(self):
+        if self._task is None:
+            # Created here so the event belongs to the running loop
+            self._flush_requested = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flusher and write out whatever is still pending"""
+        if self._task is not None:
+            # Let the flusher finish its current batch instead of cancelling it mid-write
+            self._stopping = True
+            self._flush_requested.set()
+            await self._task
+            self._task = None
+            self._flush_requested = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write out what is pending, ``batch_size`` terms per call to flush_fn.
+
+        Stops after the terms pending at the start, so steady traffic can't
+        keep it going, or at the first failure.
+        """
+        batches = -(-len(self._pending) // self.batch_size)
+        for _ in range(batches):
+            if not self._pending or not await self._flush_batch():
+                return
+
+    async def _flush_batch(self) -> bool:
+        terms = list(itertools.islice(self._pending, self.batch_size))
+        batch = {term: self._pending.pop(term) for term in terms}
+        start = time.perf_counter()
+        try:
+            await self.flush_fn(batch)
+            self.flushed_increments += sum(count for count, _ in batch.values())
+            return True
+        except Exception as e:
+            written = e.written if isinstance(e, PartialFlushError) else set()
+            self.flushed_increments += sum(
+                count for term, (count, _) in batch.items() if term in written
+            )
+            self.flush_failures += 1
+            logger.error(
+                f"Error flushing {len(batch) - len(written)} of {len(batch)} "
+                f"search counts: {e}"
+            )
+            self._requeue(
+                {term: item for term, item in batch.items() if term not in written}
+            )
+            return False
+        finally:
+            self.flushes += 1
+            self.last_flush_seconds = time.perf_counter() - start
+            self.max_flush_seconds = max(
+                self.max_flush_seconds, self.last_flush_seconds
+            )
+
+    def _requeue(self, batch: SearchCountBatch):
+        for search_term, (count, movie) in batch.items():
+            pending = self._pending.get(search_term)
+            if pending is not None:
+                self._pending[search_term] = (pending[0] + count, pending[1])
+            elif len(self._pending) < self.max_pending:
+                self._pending[search_term] = (count, movie)
+            else:
+                self.dropped_increments += count
+
+    def stats(self) -> dict:
+        return {
+            "pending_terms": len(self._pending),
+            "pending_increments": sum(count for count, _ in self._pending.values()),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "flushed_increments": self.flushed_increments,
+            "dropped_increments": self.dropped_increments,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+        }
@@ -0,0 +1,247 @@
+import bisect
+import heapq
+import json
+import os
+import re
+import tempfile
+import unicodedata
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Prefixes up to this length match a large part of the index, their best
+# titles are kept ranked instead of ranking the whole range on each query
+SHORT_PREFIX = 2
+# Titles kept per short prefix, more than a query may ask for so a few
+# removals don't force a re-rank
+SHORT_PREFIX_TOP = 100
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", stripped).strip()
+
+
+def title_keys(title: str) -> list[str]:
+    """The title from each word on, so "dark" finds "The Dark Knight" """
+    words = normalize(title).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def short_prefixes(title: str) -> set[str]:
+    return {
+        key[:length].rstrip()
+        for key in title_keys(title)
+        for length in range(1, SHORT_PREFIX + 1)
+    }
+
+
+class SuggestIndex:
+    """Typeahead over movie titles seen from TMDB, ranked by popularity.
+
+    Keys are kept in one sorted list and looked up with bisect, so a query is
+    two binary searches for the prefix range plus a top-k pass over it. For
+    one and two character prefixes, whose range can be most of the index, the
+    most popular titles are kept ranked as movies are added and evicted. At
+    most ``maxsize`` movies are kept, when full the least popular ones are
+    dropped.
+    """
+
+    def __init__(self, maxsize: int = 50000):
+        self.maxsize = maxsize
+        # movie id -> (title, popularity, poster_path)
+        self._movies: dict[int, tuple[str, float, str | None]] = {}
+        self._keys: list[tuple[str, int]] = []
+        # short prefix -> the top (-popularity, movie id) of its range, ascending
+        self._top: dict[str, list[tuple[float, int]]] = {}
+        # Short prefixes whose list holds every matching movie
+        self._complete: set[str] = set()
+        # Short prefixes whose list shrank too far and is re-ranked when queried
+        self._stale: set[str] = set()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+    def add(
+        self,
+        movie_id: int,
+        title: str | None,
+        popularity: float | None = None,
+        poster_path: str | None = None,
+    ):
+        if movie_id is None or not title:
+            return
+        current = self._movies.get(movie_id)
+        if current is not None:
+            # Keep what we knew if the new source doesn't say
+            popularity = current[1] if popularity is None else popularity
+            poster_path = poster_path or current[2]
+            for prefix in short_prefixes(current[0]):
+                self._top_discard(prefix, movie_id, current[1])
+            if current[0] != title:
+                self._remove_keys(movie_id, current[0])
+            else:
+                self._movies[movie_id] = (title, popularity, poster_path)
+                for prefix in short_prefixes(title):
+                    self._top_add(prefix, movie_id, popularity)
+                return
+        popularity = popularity or 0.0
+        self._movies[movie_id] = (title, popularity, poster_path)
+        for key in title_keys(title):
+            bisect.insort(self._keys, (key, movie_id))
+        for prefix in short_prefixes(title):
+            self._top_add(prefix, movie_id, popularity)
+        # Evict in batches so a full index doesn't rebuild on every insert
+        if len(self._movies) > self.maxsize * 1.1:
+            self._evict()
+
+    def add_movies(self, movies: list[dict]):
+        """Index TMDB results"""
+        for movie in movies:
+            self.add(
+                movie.get("id"),
+                movie.get("title"),
+                movie.get("popularity"),
+                movie.get("poster_path"),
+            )
+
+    def _remove_keys(self, movie_id: int, title: str):
+        for key in title_keys(title):
+            index = bisect.bisect_left(self._keys, (key, movie_id))
+            if index < len(self._keys) and self._keys[index] == (key, movie_id):
+                del self._keys[index]
+
+    def _top_add(self, prefix: str, movie_id: int, popularity: float):
+        top = self._top.get(prefix)
+        if top is None:
+            top = self._top[prefix] = []
+            self._complete.add(prefix)
+        entry = (-popularity, movie_id)
+        # Below the list and there may be better titles that aren't in it
+        if prefix not in self._complete and top and entry > top[-1]:
+            return
+        bisect.insort(top, entry)
+        if len(top) > SHORT_PREFIX_TOP:
+            top.pop()
+            self._complete.discard(prefix)
+
+    def _top_discard(self, prefix: str, movie_id: int, popularity: float):
+        top = self._top.get(prefix)
+        if top is None:
+            return
+        index = bisect.bisect_left(top, (-popularity, movie_id))
+        if index < len(top) and top[index][1] == movie_id:
+            del top[index]
+            if prefix not in self._complete and len(top) < SHORT_PREFIX_TOP // 2:
+                self._stale.add(prefix)
+
+    def _evict(self):
+        ranked = sorted(self._movies.items(), key=lambda item: item[1][1], reverse=True)
+        self.evictions += len(ranked) - self.maxsize
+        self._movies = dict(ranked[: self.maxsize])
+        self._rebuild()
+
+    def _rebuild(self):
+        self._keys = sorted(
+            (key, movie_id)
+            for movie_id, (title, _, _) in self._movies.items()
+            for key in title_keys(title)
+        )
+        matches: dict[str, list[tuple[float, int]]] = {}
+        for movie_id, (title, popularity, _) in self._movies.items():
+            for prefix in short_prefixes(title):
+                matches.setdefault(prefix, []).append((-popularity, movie_id))
+        self._top = {
+            prefix: heapq.nsmallest(SHORT_PREFIX_TOP, entries)
+            for prefix, entries in matches.items()
+        }
+        self._complete = {
+            prefix
+            for prefix, entries in matches.items()
+            if len(entries) <= SHORT_PREFIX_TOP
+        }
+        self._stale.clear()
+
+    def _rank(self, prefix: str, limit: int) -> list[tuple[float, int]]:
+        """The ``limit`` most popular movies with a key starting with ``prefix``"""
+        start = bisect.bisect_left(self._keys, (prefix,))
+        # Every key starting with the prefix sorts before this one
+        end = bisect.bisect_left(self._keys, (prefix + "\uffff",), start)
+        found = {movie_id for _, movie_id in self._keys[start:end]}
+        return heapq.nsmallest(
+            limit, ((-self._movies[movie_id][1], movie_id) for movie_id in found)
+        )
+
+    def suggest(self, query: str, limit: int = 10) -> list[dict]:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        top = self._top.get(prefix, [])
+        if len(prefix) <= SHORT_PREFIX and prefix in self._stale:
+            top = self._top[prefix] = self._rank(prefix, SHORT_PREFIX_TOP + 1)
+            if len(top) > SHORT_PREFIX_TOP:
+                top.pop()
+            else:
+                self._complete.add(prefix)
+            self._stale.discard(prefix)
+        if len(prefix) <= SHORT_PREFIX and (
+            len(top) >= limit or prefix in self._complete
+        ):
+            ranked = [movie_id for _, movie_id in top[:limit]]
+        else:
+            # The whole range is ranked, so popular titles are never missed
+            ranked = [movie_id for _, movie_id in self._rank(prefix, limit)]
+        return [
+            {
+                "id": movie_id,
+                "title": self._movies[movie_id][0],
+                "popularity": self._movies[movie_id][1],
+                "poster_path": self._movies[movie_id][2],
+            }
+            for movie_id in ranked
+        ]
+
+    def save(self, path: str):
+        """Write a snapshot atomically, so a crash never leaves half a file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as snapshot:
+                json.dump(
+                    [[movie_id, *movie] for movie_id, movie in self._movies.items()],
+                    snapshot,
+                )
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def load(self, path: str) -> int:
+        """Merge a snapshot into the index, returns the number of movies read"""
+        with open(path) as snapshot:
+            rows = json.load(snapshot)
+        for movie_id, title, popularity, poster_path in rows:
+            self._movies[movie_id] = (title, popularity, poster_path)
+        if len(self._movies) > self.maxsize:
+            self._evict()
+        else:
+            self._rebuild()
+        return len(rows)
+
+    def clear(self):
+        self._movies.clear()
+        self._keys.clear()
+        self._top.clear()
+        self._complete.clear()
+        self._stale.clear()
+
+    def stats(self) -> dict:
+        return {
+            "movies": len(self._movies),
+            "keys": len(self._keys),
+            "maxsize": self.maxsize,
+            "evictions": self.evictions,
+        }
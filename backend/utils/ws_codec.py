@@ -0,0 +1,94 @@
+import json
+
+try:
+    import msgpack
+except ImportError:  # in requirements.txt, JSON only if an install lacks it
+    msgpack = None
+
+# Bumped whenever a message type changes shape. Clients pick a schema version
+# and encoding through the WebSocket subprotocol, e.g. "movies.v1.msgpack".
+SCHEMA_VERSION = 1
+SUBPROTOCOL_PREFIX = f"movies.v{SCHEMA_VERSION}."
+
+
+class Codec:
+    """JSON text frames, also used for clients that don't negotiate anything"""
+
+    name = "json"
+    binary = False
+
+    def __init__(self, subprotocol: str | None = None):
+        self.subprotocol = subprotocol
+
+    def encode(self, message: dict) -> str | bytes:
+        return json.dumps(message)
+
+    def decode(self, data: str | bytes) -> dict:
+        return json.loads(data)
+
+
+class MessagePackCodec(Codec):
+    name = "msgpack"
+    binary = True
+
+    def encode(self, message: dict) -> bytes:
+        return msgpack.packb(message)
+
+    def decode(self, data: str | bytes) -> dict:
+        # Clients may still send JSON text, e.g. before their encoder loads
+        if isinstance(data, str):
+            return json.loads(data)
+        try:
+            return msgpack.unpackb(data)
+        except Exception as e:
+            raise ValueError(f"Invalid MessagePack frame: {e}") from e
+
+
+JSON_CODEC = Codec()
+
+
+def available_encodings() -> list[str]:
+    return ["json", "msgpack"] if msgpack is not None else ["json"]
+
+
+def negotiate(subprotocols: list[str]) -> Codec:
+    """Pick the first offered subprotocol we support, in the client's order"""
+    for subprotocol in subprotocols:
+        if not subprotocol.startswith(SUBPROTOCOL_PREFIX):
+            continue
+        encoding = subprotocol[len(SUBPROTOCOL_PREFIX) :]
+        if encoding == "json":
+            return Codec(subprotocol)
+        if encoding == "msgpack" and msgpack is not None:
+            return MessagePackCodec(subprotocol)
+    return JSON_CODEC
+
+
+class OutboundMessage:
+    """A message encoded at most once per encoding, however many sockets get it.
+
+    Messages relayed from another worker arrive as JSON text, which JSON
+    clients receive as is.
+    """
+
+    def __init__(self, message: dict | None = None, text: str | None = None):
+        self._message = message
+        self._encoded: dict[str, str | bytes] = {}
+        if text is not None:
+            self._encoded["json"] = text
+
+    @property
+    def message(self) -> dict:
+        if self._message is None:
+            self._message = json.loads(self._encoded["json"])
+        return self._message
+
+    @property
+    def text(self) -> str:
+        return self.encode(JSON_CODEC)
+
+    def encode(self, codec: Codec) -> str | bytes:
+        encoded = self._encoded.get(codec.name)
+        if encoded is None:
+            encoded = self._encoded[codec.name] = codec.encode(self.message)
+        return encoded
@@ -1,82 +1,478 @@
 from fastapi import WebSocket
+import asyncio
+import itertools
 import json
+import time
+import uuid
 from datetime import datetime
-from utils.logger import setup_colored_logging
+from utils.logger import SAMPLED, setup_colored_logging
+from utils.pubsub import Broker
+from utils.ws_codec import JSON_CODEC, SCHEMA_VERSION, Codec, OutboundMessage
 
 logger = setup_colored_logging()
 
+# What to do when a connection's send queue is full
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DISCONNECT = "disconnect"
+SLOW_CONSUMER_POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+
+
+_connection_ids = itertools.count(1)
+
+
+def digest_message(events: list[dict]) -> dict:
+    """Combine favorite events into one notification, newest last"""
+    if len(events) == 1:
+        event = events[0]
+        return {
+            "type": "new_favorite",
+            "message": f"🎬 {event['user_name']} just favorited {event['title']}",
+        }
+    shown = [f"{event['user_name']} favorited {event['title']}" for event in events[:3]]
+    summary = ", ".join(shown)
+    if len(events) > len(shown):
+        summary += f" and {len(events) - len(shown)} more"
+    return {
+        "type": "favorite_digest",
+        "message": f"🎬 {len(events)} new favorites: {summary}",
+        "count": len(events),
+        "favorites": [
+            {"user_name": event["user_name"], "title": event["title"]}
+            for event in events
+        ],
+    }
+
+
+class ClientConnection:
+    """A connected socket with its own bounded outbound queue and writer task"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        queue_size: int,
+        codec: Codec = JSON_CODEC,
+    ):
+        self.connection_id = next(_connection_ids)
+        self.websocket = websocket
+        self.user_id = user_id
+        self.codec = codec
+        self.queue: asyncio.Queue[str | bytes] = asyncio.Queue(maxsize=queue_size)
+        self.writer: asyncio.Task | None = None
+        self.dropped_messages = 0
+        self.last_seen = time.monotonic()
+
+    def touch(self):
+        """Record that the client was heard from"""
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, frame: str | bytes, policy: str) -> bool | None:
+        """Queue an encoded message.
+
+        Returns True if it was queued, None if a message was dropped because
+        the queue is full and False if the connection should be evicted.
+        """
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if policy == DISCONNECT:
+            return False
+        self.dropped_messages += 1
+        if policy == DROP_OLDEST:
+            self.queue.get_nowait()
+            self.queue.put_nowait(frame)
+        return None
+
+
+class ConnectionRegistry:
+    """Connections grouped by user and sharded by user id.
+
+    Each user can have any number of connections. Adding and removing a
+    connection is O(1) and the totals are kept up to date so status queries
+    never walk the registry.
+    """
+
+    def __init__(self, shard_count: int = 16):
+        self.shards: list[dict[str, dict[int, ClientConnection]]] = [
+            {} for _ in range(shard_count)
+        ]
+        self.connection_count = 0
+        self.user_count = 0
+
+    def _shard(self, user_id: str) -> dict[str, dict[int, ClientConnection]]:
+        return self.shards[hash(user_id) % len(self.shards)]
+
+    def add(self, connection: ClientConnection):
+        shard = self._shard(connection.user_id)
+        user_connections = shard.get(connection.user_id)
+        if user_connections is None:
+            user_connections = shard[connection.user_id] = {}
+            self.user_count += 1
+        user_connections[connection.connection_id] = connection
+        self.connection_count += 1
+
+    def remove(self, connection: ClientConnection) -> bool:
+        shard = self._shard(connection.user_id)
+        user_connections = shard.get(connection.user_id)
+        if (
+            user_connections is None
+            or user_connections.get(connection.connection_id) is not connection
+        ):
+            return False
+        del user_connections[connection.connection_id]
+        self.connection_count -= 1
+        if not user_connections:
+            del shard[connection.user_id]
+            self.user_count -= 1
+        return True
+
+    def get(self, user_id: str) -> list[ClientConnection]:
+        return list(self._shard(user_id).get(user_id, {}).values())
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._shard(user_id)
+
+    def __len__(self) -> int:
+        return self.connection_count
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, WebSocket] = {}
+    def __init__(
+        self,
+        send_queue_size: int = 100,
+        slow_consumer_policy: str = DROP_OLDEST,
+        shard_count: int = 16,
+    ):
+        self.connections = ConnectionRegistry(shard_count)
+        self.configure(send_queue_size, slow_consumer_policy)
+        self.dropped_messages = 0
+        self.send_failures = 0
+        self.evicted_connections = 0
+        self.messages_sent = 0
+        self._tasks: set[asyncio.Task] = set()
+        # Messages published by this worker carry its id so the echo is ignored
+        self.instance_id = uuid.uuid4().hex
+        self.broker: Broker | None = None
+        self.channel = "movies:ws"
+        self.publish_failures = 0
+        self._digest_events: list[dict] = []
+        self._digest_timer: asyncio.Task | None = None
+        self.digests_sent = 0
+        self._heartbeat: asyncio.Task | None = None
+        self.heartbeats_sent = 0
+        self.reaped_connections = 0
+        self.reap_runs = 0
+
+    async def start_broker(self, broker: Broker, channel: str = "movies:ws"):
+        """Fan messages out to the other workers through ``broker``"""
+        self.broker = broker
+        self.channel = channel
+        await broker.subscribe(channel, self._on_broker_message)
+
+    async def stop_broker(self):
+        if self.broker is not None:
+            await self.broker.close()
+            self.broker = None
+
+    async def _publish(self, envelope: dict):
+        if self.broker is None:
+            return
+        envelope["origin"] = self.instance_id
+        try:
+            await self.broker.publish(self.channel, json.dumps(envelope))
+        except Exception as e:
+            self.publish_failures += 1
+            logger.error(f"Error publishing to {self.channel}: {e}")
+
+    async def _on_broker_message(self, data: str):
+        envelope = json.loads(data)
+        if envelope.get("origin") == self.instance_id:
+            return
+        if envelope["kind"] == "personal":
+            self._deliver_to_user(
+                envelope["user_id"], OutboundMessage(text=envelope["text"])
+            )
+        elif envelope["kind"] == "broadcast":
+            await self._deliver_to_all_other(
+                OutboundMessage(text=envelope["text"]), envelope["excluded"]
+            )
+        elif envelope["kind"] == "digest":
+            await self._deliver_digest(envelope["events"])
+
+    def configure(
+        self,
+        send_queue_size: int,
+        slow_consumer_policy: str,
+        shard_count: int | None = None,
+        digest_window: float = 0,
+        digest_max_events: int = 100,
+        heartbeat_interval: float = 0,
+        idle_timeout: float = 90,
+        reap_batch_size: int = 100,
+    ):
+        """A ``digest_window`` above zero batches new_favorite notifications,
+        sending one combined message per recipient every window or once
+        ``digest_max_events`` are pending, whichever comes first.
+
+        A ``heartbeat_interval`` above zero pings connections that have been
+        quiet for an interval and reaps those quiet for ``idle_timeout``.
+        """
+        if slow_consumer_policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {slow_consumer_policy}")
+        self.send_queue_size = send_queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.digest_window = digest_window
+        self.digest_max_events = digest_max_events
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.reap_batch_size = reap_batch_size
+        if shard_count and shard_count != len(self.connections.shards):
+            if len(self.connections):
+                raise RuntimeError("Cannot reshard while connections are active")
+            self.connections = ConnectionRegistry(shard_count)
+
+    def start_heartbeat(self):
+        if self.heartbeat_interval > 0 and self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+
+    async def stop_heartbeat(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
 
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
+    async def _run_heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.error(f"Error running WebSocket heartbeat: {e}")
+
+    async def heartbeat(self) -> int:
+        """Ping quiet connections and reap idle ones, returns the reap count"""
+        now = time.monotonic()
+        ping = OutboundMessage({"type": "ping", "timestamp": int(time.time() * 1000)})
+        idle = []
+        for shard in self.connections.shards:
+            for user_connections in list(shard.values()):
+                for connection in list(user_connections.values()):
+                    quiet_for = now - connection.last_seen
+                    if quiet_for >= self.idle_timeout:
+                        idle.append(connection)
+                    elif quiet_for >= self.heartbeat_interval:
+                        if self._enqueue(connection, ping):
+                            self.heartbeats_sent += 1
+        self.reap_runs += 1
+
+        # Close in batches so a mass timeout doesn't stall the loop
+        for start in range(0, len(idle), self.reap_batch_size):
+            batch = idle[start : start + self.reap_batch_size]
+            await asyncio.gather(
+                *(self.disconnect(c.user_id, c) for c in batch),
+                return_exceptions=True,
+            )
+            await asyncio.sleep(0)
+        if idle:
+            self.reaped_connections += len(idle)
+            logger.info(f"Reaped {len(idle)} idle WebSocket connections")
+        return len(idle)
+
+    async def connect(
+        self, websocket: WebSocket, user_id: str, codec: Codec = JSON_CODEC
+    ) -> ClientConnection:
+        await websocket.accept(subprotocol=codec.subprotocol)
+        connection = ClientConnection(websocket, user_id, self.send_queue_size, codec)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.connections.add(connection)
         logger.info(
-            f"User {user_id} connected. Total connections: {len(self.active_connections)}"
+            f"User {user_id} connected. Total connections: {len(self.connections)}"
         )
 
-        await self.send_personal_message(
+        await self.send_to_connection(
             {
                 "type": "connection_established",
                 "message": "Connected to movie notifications!",
+                "version": SCHEMA_VERSION,
+                "encoding": codec.name,
             },
-            user_id,
+            connection,
         )
+        return connection
 
-    async def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            websocket_to_close = self.active_connections.get(user_id)
-            del self.active_connections[user_id]
-            logger.info(
-                f"User {user_id} disconnected. Total connections: {len(self.active_connections)}"
+    async def disconnect(
+        self, user_id: str, connection: ClientConnection | None = None
+    ):
+        """Remove ``connection``, or every connection of the user if none is given"""
+        targets = (
+            [connection] if connection is not None else self.connections.get(user_id)
+        )
+        for target in targets:
+            if self.connections.remove(target):
+                logger.info(
+                    f"User {user_id} disconnected. Total connections: {len(self.connections)}"
+                )
+                await self._close(target)
+
+    async def _close(self, connection: ClientConnection):
+        if (
+            connection.writer is not None
+            and connection.writer is not asyncio.current_task()
+        ):
+            connection.writer.cancel()
+        try:
+            await connection.websocket.close()
+            logger.info(f"WebSocket for user {connection.user_id} explicitly closed.")
+        except RuntimeError as e:
+            logger.warning(
+                f"Attempted to close already-closed WebSocket for user {connection.user_id}: {e}"
             )
-            if websocket_to_close:
-                try:
-                    await websocket_to_close.close()
-                    logger.info(f"WebSocket for user {user_id} explicitly closed.")
-                except RuntimeError as e:
-                    logger.warning(
-                        f"Attempted to close already-closed WebSocket for user {user_id}: {e}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error closing WebSocket for user {user_id}: {e}")
+        except Exception as e:
+            logger.error(f"Error closing WebSocket for user {connection.user_id}: {e}")
 
-        logger.info(
-            f"User {user_id} disconnected. Total connections: {len(self.active_connections)}"
+    async def _write(self, connection: ClientConnection):
+        """Drain one connection's queue so a slow client only delays itself"""
+        while True:
+            frame = await connection.queue.get()
+            try:
+                if isinstance(frame, bytes):
+                    await connection.websocket.send_bytes(frame)
+                else:
+                    await connection.websocket.send_text(frame)
+                self.messages_sent += 1
+            except Exception as e:
+                logger.error(f"Error sending message to {connection.user_id}: {e}")
+                self.send_failures += 1
+                await self.disconnect(connection.user_id, connection)
+                return
+
+    def _enqueue(self, connection: ClientConnection, outbound: OutboundMessage) -> bool:
+        queued = connection.enqueue(
+            outbound.encode(connection.codec), self.slow_consumer_policy
         )
+        if queued is not False:
+            if queued is None:
+                self.dropped_messages += 1
+            # With drop_oldest the new message is still delivered
+            return queued or self.slow_consumer_policy == DROP_OLDEST
+        logger.warning(f"Evicting slow consumer {connection.user_id}")
+        self.evicted_connections += 1
+        task = asyncio.create_task(self.disconnect(connection.user_id, connection))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return False
+
+    async def send_to_connection(self, message: dict, connection: ClientConnection):
+        """Send message to one socket, e.g. a reply to something it sent"""
+        if self._enqueue(connection, OutboundMessage(message)):
+            logger.info(
+                "Message sent to %s: %s",
+                connection.user_id,
+                message.get("type"),
+                extra=SAMPLED,
+            )
+            return True
+        return False
+
+    def _deliver_to_user(self, user_id: str, outbound: OutboundMessage) -> bool:
+        sent = [
+            self._enqueue(connection, outbound)
+            for connection in self.connections.get(user_id)
+        ]
+        return any(sent)
 
     async def send_personal_message(self, message: dict, user_id: str):
-        """Send message to specific user"""
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_text(json.dumps(message))
-                logger.info(f"Message sent to {user_id}: {message}")
-                return True
-            except Exception as e:
-                logger.error(f"Error sending message to {user_id}: {e}")
-                self.disconnect(user_id)
-                return False
+        """Send message to every connection of a specific user, on every worker"""
+        outbound = OutboundMessage(message)
+        if self.broker is not None:
+            await self._publish(
+                {"kind": "personal", "user_id": user_id, "text": outbound.text}
+            )
+        if self._deliver_to_user(user_id, outbound):
+            logger.info(
+                "Message sent to %s: %s", user_id, message.get("type"), extra=SAMPLED
+            )
+            return True
         return False
 
     async def broadcast_to_all_other(self, message: dict, excluded_user_id: str):
-        disconnected_users = []
-        connections_copy = list(self.active_connections.items())
-        active_user_count = len(connections_copy)
-        for user_id, connection in connections_copy:
-            if user_id != excluded_user_id:
-                try:
-                    await connection.send_text(json.dumps(message))
-                    logger.info(f"Notification sent to user {user_id}")
-                except Exception as e:
-                    logger.error(f"Error sending notification to {user_id}: {e}")
-                    disconnected_users.append(user_id)
-
-        for user_id in disconnected_users:
-            await self.disconnect(user_id)
-
-        return active_user_count - len(disconnected_users) - 1
+        """Send message to everyone but the sender, returns the local recipient count"""
+        # Encoded once per encoding, recipients using the same one share a frame
+        outbound = OutboundMessage(message)
+        if self.broker is not None:
+            await self._publish(
+                {
+                    "kind": "broadcast",
+                    "excluded": excluded_user_id,
+                    "text": outbound.text,
+                }
+            )
+        return await self._deliver_to_all_other(outbound, excluded_user_id)
+
+    async def _deliver_to_all_other(
+        self, outbound: OutboundMessage, excluded_user_id: str
+    ) -> int:
+        sent = 0
+        for shard in self.connections.shards:
+            for user_id, user_connections in list(shard.items()):
+                if user_id == excluded_user_id:
+                    continue
+                for connection in list(user_connections.values()):
+                    if self._enqueue(connection, outbound):
+                        sent += 1
+            # Let other tasks run between shards on very large broadcasts
+            await asyncio.sleep(0)
+        return sent
+
+    async def _add_digest_event(self, event: dict):
+        self._digest_events.append(event)
+        if len(self._digest_events) >= self.digest_max_events:
+            await self.flush_digest()
+        elif self._digest_timer is None:
+            self._digest_timer = asyncio.create_task(self._flush_digest_later())
+
+    async def _flush_digest_later(self):
+        await asyncio.sleep(self.digest_window)
+        self._digest_timer = None
+        await self.flush_digest()
+
+    async def flush_digest(self) -> int:
+        """Send pending favorite events now, also called on shutdown"""
+        if self._digest_timer is not None:
+            if self._digest_timer is not asyncio.current_task():
+                self._digest_timer.cancel()
+            self._digest_timer = None
+        events, self._digest_events = self._digest_events, []
+        if not events:
+            return 0
+        await self._publish({"kind": "digest", "events": events})
+        sent = await self._deliver_digest(events)
+        self.digests_sent += 1
+        logger.info(f"Digest of {len(events)} favorites sent to {sent} connections")
+        return sent
+
+    async def _deliver_digest(self, events: list[dict]) -> int:
+        """One message per recipient, leaving out the recipient's own favorites"""
+        authors = {event["user_id"] for event in events}
+        shared = OutboundMessage(digest_message(events))
+        sent = 0
+        for shard in self.connections.shards:
+            for user_id, user_connections in list(shard.items()):
+                outbound = shared
+                if user_id in authors:
+                    others = [e for e in events if e["user_id"] != user_id]
+                    if not others:
+                        continue
+                    outbound = OutboundMessage(digest_message(others))
+                for connection in list(user_connections.values()):
+                    if self._enqueue(connection, outbound):
+                        sent += 1
+            await asyncio.sleep(0)
+        return sent
 
     async def handle_favorite_action(
         self, user_id: str, movie_data: dict, user_name: str
@@ -95,6 +491,16 @@ class ConnectionManager:
                 user_id,
             )
 
+            if self.digest_window > 0:
+                await self._add_digest_event(
+                    {
+                        "user_id": user_id,
+                        "user_name": user_name,
+                        "title": movie_data["title"],
+                    }
+                )
+                return 0
+
             notifications_sent = await self.broadcast_to_all_other(
                 notification, user_id
             )
@@ -106,5 +512,24 @@ class ConnectionManager:
             logger.error(f"Error handling favorite action for {user_id}: {e}")
             return 0
 
+    def stats(self) -> dict:
+        return {
+            "active_connections": self.connections.connection_count,
+            "connected_users": self.connections.user_count,
+            "shards": len(self.connections.shards),
+            "messages_sent": self.messages_sent,
+            "dropped_messages": self.dropped_messages,
+            "send_failures": self.send_failures,
+            "evicted_connections": self.evicted_connections,
+            "publish_failures": self.publish_failures,
+            "digest_window": self.digest_window,
+            "pending_digest_events": len(self._digest_events),
+            "digests_sent": self.digests_sent,
+            "heartbeat_interval": self.heartbeat_interval,
+            "heartbeats_sent": self.heartbeats_sent,
+            "reaped_connections": self.reaped_connections,
+            "reap_runs": self.reap_runs,
+        }
+
 
 manager = ConnectionManager()
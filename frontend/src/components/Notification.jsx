@@ -19,7 +19,8 @@ const Notification = () => {
           (currentMessage = popFirstMessage()) !== null &&
           (currentMessage.type === "connection_established" ||
             currentMessage.type === "favorite_confirmed" ||
-            currentMessage.type === "new_favorite")
+            currentMessage.type === "new_favorite" ||
+            currentMessage.type === "favorite_digest")
         ) {
           setMessage(currentMessage);
           setIsVisible(true);
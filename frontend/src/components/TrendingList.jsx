@@ -89,11 +89,8 @@ function TrendingList() {
   }, [data]);
 
   if (error) return <p className="text-red-500">Error: {error.message}</p>;
-  if (!data || data.length === 0) return <p>No trending movies found.</p>;
-  const movies = data.map((movie) => ({
-    ...movie,
-    movie_json: movie.movie_json ? JSON.parse(movie.movie_json) : null,
-  }));
+  if (!data || data.movies.length === 0)
+    return <p>No trending movies found.</p>;
 
   return (
     <section className="trending">
@@ -102,8 +99,8 @@ function TrendingList() {
         <Spinner />
       ) : (
         <ul ref={scrollContainerRef} style={{ userSelect: "none" }}>
-          {data.map((movie, index) => (
-            <li key={movie.$id}>
+          {data.movies.map((movie, index) => (
+            <li key={movie.search_term}>
               <p>{index + 1}</p>
               <img src={movie.poster_url} alt={movie.title} draggable={false} />
             </li>
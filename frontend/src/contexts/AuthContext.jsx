@@ -58,6 +58,13 @@ const AuthProvider = ({ children }) => {
   };
 
   const logoutUser = async () => {
+    if (jwt) {
+      // Drop the token from the backend's validation cache
+      fetch(`${config.fastapiBaseUrl}/api/logout`, {
+        method: "POST",
+        headers: { Authorization: `Bearer ${jwt}` },
+      }).catch(() => {});
+    }
     await account.deleteSession("current");
     setUser(null);
     setJwt(null);
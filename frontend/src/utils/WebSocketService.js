@@ -30,6 +30,18 @@ class WebSocketService {
       this.ws.send(JSON.stringify({ type: "ping", timestamp: Date.now() }));
     };
 
+    // Answer the server heartbeat so the connection isn't reaped as idle
+    this.ws.addEventListener("message", (event) => {
+      try {
+        const data = JSON.parse(event.data);
+        if (data.type === "ping") {
+          this.send({ type: "pong", timestamp: data.timestamp });
+        }
+      } catch {
+        // Not JSON, nothing to answer
+      }
+    });
+
     this.ws.onclose = () => {
       this.connected = false;
     };